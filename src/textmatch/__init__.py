@@ -1 +1,5 @@
 from .textmatch import run as run
+from .textmatch import run_async as run_async
+from .textmatch import dedupe as dedupe
+from .textmatch import sweep as sweep
+from .textmatch import prepare as prepare
@@ -1,8 +1,11 @@
-from typing import Optional
+from typing import Optional, cast
+import os
 import sys
 import warnings
 import colorama
+import numpy # transitive dependency of polars-ds
 import polars
+import pyarrow # transitive dependency of polars
 import dedupe
 import dedupe.core
 import dedupe.variables
@@ -22,29 +25,22 @@ def execute(
         threshold: float,
         index: int,
         ticker: Ticker,
-        alert: Optional[Alert]) -> PolarsDataframe:
+        alert: Optional[Alert],
+        model: Optional[str] = None,
+        training: Optional[str] = None,
+        disk: bool = False,
+        workers: Optional[int] = None) -> PolarsDataframe:
     fields1 = list(fieldmap1.keys())
     fields2 = list(fieldmap2.keys())
     headers1 = list(fieldmap1.values())
     headers2 = list(fieldmap2.values())
-    # add match columns to data1 and data2
-    for i, (header1, header2) in enumerate(zip(headers1, headers2)):
-        match_column = f'_block{index}_match_col{i}'
-        data1 = data1.with_columns(polars.col(header1).alias(match_column))
-        data2 = data2.with_columns(polars.col(header2).alias(match_column))
-    # transform data1 and data2 into the format required by Dedupe
-    input1 = {row['_data1_id']: row for row in data1.to_dicts()}
-    input2 = {row['_data2_id']: row for row in data2.to_dicts()}
-    # remove the match columns from data1 and data2
-    for i, _ in enumerate(zip(headers1, headers2)):
-        match_column = f'_block{index}_match_col{i}'
-        data1 = data1.drop(match_column)
-        data2 = data2.drop(match_column)
+    # transform data1 and data2 into the format required by Dedupe, with only the match columns so nothing else is copied
+    match_columns1 = [polars.col(header1).alias(f'_block{index}_match_col{i}') for i, header1 in enumerate(headers1)]
+    match_columns2 = [polars.col(header2).alias(f'_block{index}_match_col{i}') for i, header2 in enumerate(headers2)]
+    input1 = dict(zip(data1['_data1_id'].to_list(), data1.select(match_columns1).to_dicts()))
+    input2 = dict(zip(data2['_data2_id'].to_list(), data2.select(match_columns2).to_dicts()))
     # create a Dedupe variable specification listing all the match columns
     variables = [dedupe.variables.String(f'_block{index}_match_col{i}') for i in range(len(headers1))]
-    # set up Dedupe
-    linker = dedupe.RecordLink(variables, in_memory=True) # generate pairs in-memory, uses more memory, but faster
-    linker.prepare_training(input1, input2, sample_size=15_000) # this sample size is what's used in the Dedupe docs
     with warnings.catch_warnings():
         def warning_alert(warning, *args):
             message = str(warning)
@@ -52,32 +48,52 @@ def execute(
                 message = 'More training will produce better results!'
             if alert: alert(message, importance='warning')
         warnings.showwarning = warning_alert
-        while True:
-            label(linker, fields1, fields2)
-            try:
-                linker.train() # throws a ValueError if not enough training has been done
-                break
-            except ValueError:
-                if alert: alert('Not enough training has been completed to run a match', importance='warning')
+        if model is not None and os.path.exists(model): # a previously-trained model means no sampling or training is needed
+            if alert: alert(f'{model}: using previously-trained model')
+            with open(model, 'rb') as model_file:
+                linker = dedupe.StaticRecordLink(model_file, num_cores=workers, in_memory=not disk)
+        else:
+            # set up Dedupe
+            linker = dedupe.RecordLink(variables, num_cores=workers, in_memory=not disk) # generating pairs in-memory uses more memory, but is faster
+            labelled = training is not None and os.path.exists(training)
+            if labelled:
+                if alert: alert(f'{training}: using previously-labelled pairs')
+                with open(cast(str, training)) as training_file:
+                    linker.prepare_training(input1, input2, training_file=training_file, sample_size=15_000)
+            else:
+                linker.prepare_training(input1, input2, sample_size=15_000) # this sample size is what's used in the Dedupe docs
+            while True:
+                if not labelled: label(linker, fields1, fields2)
+                try:
+                    linker.train() # throws a ValueError if not enough training has been done
+                    break
+                except ValueError:
+                    if alert: alert('Not enough training has been completed to run a match', importance='warning')
+                    labelled = False
+            if training is not None:
+                with open(training, 'w') as training_file:
+                    linker.write_training(training_file)
+            if model is not None:
+                with open(model, 'wb') as model_file:
+                    linker.write_settings(model_file)
         tick = ticker(3) if ticker else None
         if tick: tick()
         # run a Dedupe join
         pairs = linker.join(input1, input2, threshold, 'many-to-many')
         if tick: tick()
-        # transform Dedupe output into something that can be converted back into a dataframe
-        matches = {}
-        for ([data1_id, data2_id], degree) in pairs:
-            for column_number, column in enumerate(data1.columns):
-                if f'_block{index}_match_col' in column: continue
-                item = data1.filter(polars.col('_data1_id') == int(data1_id)).select(polars.col(column)).item()
-                matches.setdefault(column, []).append(item)
-            for column_number, column in enumerate(data2.columns):
-                if f'_block{index}_match_col' in column: continue
-                item = data2.filter(polars.col('_data2_id') == int(data2_id)).select(polars.col(column)).item()
-                matches.setdefault(column, []).append(item)
-            matches.setdefault(f'_block{index}_degree', []).append(degree)
+        # transform Dedupe output into a table of ids, then join the rest of each row back on
+        links_dtype = numpy.dtype([('pairs', numpy.uint32, 2), ('score', numpy.float32)])
+        links = numpy.array(pairs).astype(links_dtype) if pairs else numpy.empty(0, links_dtype)
+        links_table = pyarrow.table({
+            '_data1_id': pyarrow.array(links['pairs'][:, 0], pyarrow.uint32()),
+            '_data2_id': pyarrow.array(links['pairs'][:, 1], pyarrow.uint32()),
+            f'_block{index}_degree': pyarrow.array(links['score'], pyarrow.float32())
+        })
+        matches = cast(PolarsDataframe, polars.from_arrow(links_table))
+        matches = matches.join(data1, on='_data1_id', how='inner', maintain_order='left').join(data2, on='_data2_id', how='inner', maintain_order='left')
+        matches = matches.select(*data1.columns, *data2.columns, f'_block{index}_degree')
         if tick: tick()
-        return polars.from_dict(matches)
+        return matches
 
 def label(linker: dedupe.RecordLink, fields1: list[str], fields2: list[str]) -> None:
     colorama.just_fix_windows_console()
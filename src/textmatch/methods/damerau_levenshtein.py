@@ -1,10 +1,65 @@
+from typing import Optional
 from ..typings import PolarsDataframe
+import numpy # transitive dependency of polars-ds
 import polars
 import polars_ds
 
-def damerau_levenshtein(a: polars.Expr, b: polars.Expr) -> polars.Expr:
-    return polars_ds.str_d_leven(a, b, return_sim=True, parallel=True).cast(polars.Float32)
+MINIMUM_THRESHOLD = 0.5 # below this the bounds rule out too few pairs to be worth working out
+ALPHABET_SIZE = 255 # characters counted separately, with all others counted together, so the counts stay small however varied the text is
+PACK_VALUES = 100_000 # values from data2 counted at once
 
-def compare(data: PolarsDataframe, header1: str, header2: str, header_degree: str) -> PolarsDataframe:
-    degree = damerau_levenshtein(polars.col(header1), polars.col(header2))
+type Packed = tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+
+def damerau_levenshtein(a: polars.Expr, b: polars.Expr, parallel: bool = True) -> polars.Expr:
+    return polars_ds.str_d_leven(a, b, return_sim=True, parallel=parallel).cast(polars.Float32)
+
+def compare(data: PolarsDataframe, header1: str, header2: str, header_degree: str, parallel: bool = True) -> PolarsDataframe:
+    degree = damerau_levenshtein(polars.col(header1), polars.col(header2), parallel)
     return data.with_columns(degree.alias(header_degree))
+
+def candidates(data1: PolarsDataframe, data2: PolarsDataframe, header1: str, header2: str, threshold: float) -> Optional[PolarsDataframe]:
+    if threshold < MINIMUM_THRESHOLD: return None # every pair is scored instead
+    # each distinct value from data1 is checked against every distinct value from data2 at once, keeping pairs whose lengths and characters are close enough that they could reach the threshold
+    queries = data1.drop_nulls(header1).group_by(header1, maintain_order=True).agg('_data1_id').with_row_index('_query')
+    values = data2.drop_nulls(header2).group_by(header2, maintain_order=True).agg('_data2_id').with_row_index('_value')
+    query_rows = [numpy.array([], dtype=numpy.uint32)]
+    value_rows = [numpy.array([], dtype=numpy.uint32)]
+    for offset in range(0, len(values), PACK_VALUES):
+        packed = pack(values[header2].slice(offset, PACK_VALUES).to_list())
+        for query_row, query in enumerate(queries[header1].to_list()):
+            passing = numpy.flatnonzero(bounded(query, packed, threshold))
+            query_rows.append(numpy.full(len(passing), query_row, dtype=numpy.uint32))
+            value_rows.append((passing + offset).astype(numpy.uint32))
+    pairs = polars.DataFrame({'_query': numpy.concatenate(query_rows), '_value': numpy.concatenate(value_rows)})
+    pairs = pairs.join(queries.select('_query', '_data1_id'), on='_query').explode('_data1_id')
+    pairs = pairs.join(values.select('_value', '_data2_id'), on='_value').explode('_data2_id')
+    return pairs.select('_data1_id', '_data2_id').sort('_data1_id', '_data2_id')
+
+def pack(values: list[str]) -> Packed:
+    # the length of each value, alongside how many of each character it contains, with one row per character
+    lengths = numpy.array([len(value) for value in values], dtype=numpy.int32)
+    codes = numpy.frombuffer(''.join(values).encode('utf-32-le'), dtype=numpy.uint32)
+    common, frequencies = numpy.unique(codes, return_counts=True)
+    alphabet = numpy.sort(common[numpy.argsort(frequencies, kind='stable')[::-1][:ALPHABET_SIZE]])
+    positions = alphabet_positions(alphabet, codes)
+    cells = numpy.repeat(numpy.arange(len(values)), lengths) * (len(alphabet) + 1) + positions
+    counts = numpy.bincount(cells, minlength=len(values) * (len(alphabet) + 1)).reshape(len(values), len(alphabet) + 1).T.astype(numpy.min_scalar_type(lengths.max(initial=0)), order='C')
+    return lengths, alphabet, counts
+
+def alphabet_positions(alphabet: numpy.ndarray, codes: numpy.ndarray) -> numpy.ndarray:
+    # characters outside the alphabet all share the last position
+    positions = numpy.searchsorted(alphabet, codes)
+    known = positions < len(alphabet)
+    known[known] = alphabet[positions[known]] == codes[known]
+    return numpy.where(known, positions, len(alphabet))
+
+def bounded(query: str, packed: Packed, threshold: float) -> numpy.ndarray:
+    lengths, alphabet, counts = packed
+    # the most edits each pair can have and still reach the threshold, slightly generous so float rounding never loses a match
+    limits = numpy.floor((1 - threshold) * numpy.maximum(len(query), lengths) + 1e-6).astype(numpy.int32)
+    passing = numpy.abs(lengths - len(query)) <= limits # the length difference alone needs this many edits
+    # every edit adds or removes at most one character from each side, so characters the two do not have in common need at least that many
+    query_positions, query_counts = numpy.unique(alphabet_positions(alphabet, numpy.frombuffer(query.encode('utf-32-le'), dtype=numpy.uint32)), return_counts=True) # counting characters outside the alphabet together can only overestimate what is shared
+    shared = numpy.minimum(counts[query_positions], query_counts[:, None]).sum(axis=0)
+    unshared = numpy.maximum(lengths, len(query)) - shared
+    return passing & (unshared <= limits)
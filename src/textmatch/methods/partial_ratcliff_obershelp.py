@@ -2,6 +2,8 @@ from ..typings import PolarsDataframe
 import polars
 import polars_ds
 
+GRAM_LENGTH = 3
+
 def partial_ratcliff_obershelp(a: polars.Expr, b: polars.Expr) -> polars.Expr:
     a_length = a.str.len_chars()
     b_length = b.str.len_chars()
@@ -11,3 +13,33 @@ def partial_ratcliff_obershelp(a: polars.Expr, b: polars.Expr) -> polars.Expr:
 def compare(data: PolarsDataframe, header1: str, header2: str, header_degree: str) -> PolarsDataframe:
     degree = partial_ratcliff_obershelp(polars.col(header1), polars.col(header2)).cast(polars.Float32)
     return data.with_columns(degree.alias(header_degree))
+
+def candidates(data1: PolarsDataframe, data2: PolarsDataframe, header1: str, header2: str, threshold: float) -> PolarsDataframe:
+    # a pair can only reach the threshold if it shares a substring of at least threshold × the shorter length, so index the grams of both sides once and only keep pairs sharing enough of them
+    own_size = polars.col('_gram_own_size')
+    probes1 = grams(data1, '_data1_id', header1, threshold, own_size, own_size) # only the gram size for its own length
+    probes2 = grams(data2, '_data2_id', header2, threshold, own_size, own_size)
+    index1 = grams(data1, '_data1_id', header1, threshold, polars.lit(1), own_size - 1) # smaller gram sizes only, so each pair is found from one side
+    index2 = grams(data2, '_data2_id', header2, threshold, polars.lit(1), own_size)
+    hits = polars.concat([
+        probes1.join(index2, on=['_gram', '_gram_size'], how='inner', suffix='_other').rename({'_gram_length': '_gram_length1', '_gram_length_other': '_gram_length2'}),
+        probes2.join(index1, on=['_gram', '_gram_size'], how='inner', suffix='_other').rename({'_gram_length': '_gram_length2', '_gram_length_other': '_gram_length1'})
+    ], how='diagonal')
+    counts = hits.group_by('_data1_id', '_data2_id').agg(
+        polars.len().alias('_gram_hits'),
+        polars.first('_gram_size'),
+        polars.min_horizontal(polars.first('_gram_length1'), polars.first('_gram_length2')).alias('_gram_shorter')
+    )
+    substring_length = polars.max_horizontal((polars.col('_gram_shorter') * threshold).floor().cast(polars.Int64), polars.lit(1))
+    counts = counts.filter(polars.col('_gram_hits') >= substring_length - polars.col('_gram_size') + 1) # a common substring of length n contains n - size + 1 gram occurrences
+    return counts.select('_data1_id', '_data2_id').sort('_data1_id', '_data2_id')
+
+def grams(data: PolarsDataframe, id_column: str, header: str, threshold: float, smallest: polars.Expr, largest: polars.Expr) -> PolarsDataframe:
+    length = polars.col(header).str.len_chars()
+    own_size = polars.min_horizontal(polars.max_horizontal((length * threshold).floor().cast(polars.Int64), polars.lit(1)), polars.lit(GRAM_LENGTH))
+    data = data.select(polars.col(id_column), polars.col(header).alias('_gram_value'), length.alias('_gram_length'), own_size.alias('_gram_own_size'))
+    data = data.filter(polars.col('_gram_length') > 0)
+    data = data.with_columns(polars.int_ranges(smallest, largest + 1).alias('_gram_size')).explode('_gram_size').drop_nulls('_gram_size')
+    data = data.with_columns(polars.int_ranges(0, polars.col('_gram_length') - polars.col('_gram_size') + 1).alias('_gram_offset')).explode('_gram_offset')
+    data = data.with_columns(polars.col('_gram_value').str.slice(polars.col('_gram_offset'), polars.col('_gram_size')).alias('_gram'))
+    return data.select(id_column, '_gram', '_gram_size', '_gram_length')
@@ -1,33 +1,431 @@
-from typing import Callable, Optional, cast
+from typing import Callable, Iterator, Optional, cast, overload
+import concurrent.futures
+import contextlib
+import functools
+import hashlib
 import importlib.resources
+import json
+import os
 import re
-import unidecode
+import sys
+import time
 import polars
-import psutil
+import polars.io.plugins
 
 from .typings import (
     PolarsDataframe,
-    PandasDataframe,
+    PolarsLazyframe,
     ArrowDataframe,
+    ArrowStreamable,
+    ArrowArrayable,
+    Summary,
+    Sweep,
     Source,
+    Prepared,
     Matching,
     Blocks,
+    Checkpoint,
+    Candidates,
     Ticker,
+    Measure,
     Progress,
+    Profile,
+    Stage,
+    Resources,
     Alert
 )
 
+HOT_PAIRS = 1_000_000 # values producing more pairs than this are pointed out, as they take up most of the time a match takes
+TILE_PAIRS = 1_000_000 # pairs scored at once by compared methods, each saved when checkpointing so a block can pick up part way through
+SAMPLE_PAIRS = 2_000_000 # pairs compared to choose an automatic blocking key, between a sample of the first dataset and all of the second
+ASYNC_JOBS = 2 # matches run at once by run_async unless given an executor, as each one already spreads its work across every core
+DEADLINE_ROWS = 100 # rows from the first dataset in the first slice matched against a deadline, with later slices sized to fit the time left
+
+class DeadlineReached(Exception):
+    pass
+
+class Cancelled(Exception):
+    pass
+
+@overload
+def run(source1: Source,
+        source2: Source,
+        matching: Optional[Matching] = None,
+        output: Optional[list[str]] = None,
+        join: str = 'inner',
+        progress: Optional[Progress] = None,
+        alert: Optional[Alert] = None,
+        sink: None = None,
+        auto_block: bool = False,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None,
+        checkpoint_dir: Optional[str | os.PathLike] = None,
+        deadline: Optional[float] = None) -> ArrowDataframe: ...
+
+@overload
 def run(source1: Source,
         source2: Source,
         matching: Optional[Matching] = None,
         output: Optional[list[str]] = None,
         join: str = 'inner',
         progress: Optional[Progress] = None,
-        alert: Optional[Alert] = None) -> ArrowDataframe:
-    data1 = use(source1)
-    data2 = use(source2)
-    data1, columnmap1 = disambiguate(data1, 'data1')
-    data2, columnmap2 = disambiguate(data2, 'data2')
+        alert: Optional[Alert] = None,
+        sink: str | os.PathLike = ...,
+        auto_block: bool = False,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None,
+        checkpoint_dir: Optional[str | os.PathLike] = None,
+        deadline: Optional[float] = None) -> Summary: ...
+
+@overload
+def run(source1: Source,
+        source2: Source,
+        matching: Optional[Matching] = None,
+        output: Optional[list[str]] = None,
+        join: str = 'inner',
+        progress: Optional[Progress] = None,
+        alert: Optional[Alert] = None,
+        sink: Optional[str | os.PathLike] = None,
+        auto_block: bool = False,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None,
+        checkpoint_dir: Optional[str | os.PathLike] = None,
+        deadline: Optional[float] = None) -> ArrowDataframe | Summary: ...
+
+def run(source1: Source,
+        source2: Source,
+        matching: Optional[Matching] = None,
+        output: Optional[list[str]] = None,
+        join: str = 'inner',
+        progress: Optional[Progress] = None,
+        alert: Optional[Alert] = None,
+        sink: Optional[str | os.PathLike] = None,
+        auto_block: bool = False,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None,
+        checkpoint_dir: Optional[str | os.PathLike] = None,
+        deadline: Optional[float] = None) -> ArrowDataframe | Summary:
+    started = time.perf_counter() # the deadline counts from here
+    writer = sinker(os.fspath(sink), output) if sink is not None else None # check this first, before any matching work is done
+    govern(resources, alert)
+    if deadline is not None and output is None: output = ['1*', '2*', 'complete'] # say which rows might be missing matches
+    measure = measurer(profile)
+    data1, data2, columnmap1, columnmap2, blocks = setup(source1, source2, matching, output, alert, measure)
+    if auto_block: data1, data2, blocks = autoblock(data1, data2, blocks, alert)
+    if deadline is not None:
+        if checkpoint_dir is not None and alert: alert('checkpoints are not used with a deadline, as how the data is sliced up depends on timing', importance='warning')
+        matches, examined = match_deadline(data1, data2, blocks, progress, alert, started + deadline, profile, resources)
+    else:
+        checkpoint = checkpointer(checkpoint_dir, data1, data2)
+        matches = match(data1, data2, blocks, progress, alert, profile=profile, resources=resources, checkpoint=checkpoint)
+        examined = None
+    with measure('supplement') as record:
+        outputs = supplement(join, data1, data2, matches, examined)
+        record.update(rows_in=len(matches), rows_out=len(outputs))
+    return deliver(outputs, columnmap1, columnmap2, output, alert, writer, sink, measure)
+
+@overload
+def dedupe(source: Source,
+        matching: Optional[Matching] = None,
+        output: Optional[list[str]] = None,
+        mirror: bool = False,
+        progress: Optional[Progress] = None,
+        alert: Optional[Alert] = None,
+        sink: None = None,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None,
+        checkpoint_dir: Optional[str | os.PathLike] = None) -> ArrowDataframe: ...
+
+@overload
+def dedupe(source: Source,
+        matching: Optional[Matching] = None,
+        output: Optional[list[str]] = None,
+        mirror: bool = False,
+        progress: Optional[Progress] = None,
+        alert: Optional[Alert] = None,
+        sink: str | os.PathLike = ...,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None,
+        checkpoint_dir: Optional[str | os.PathLike] = None) -> Summary: ...
+
+@overload
+def dedupe(source: Source,
+        matching: Optional[Matching] = None,
+        output: Optional[list[str]] = None,
+        mirror: bool = False,
+        progress: Optional[Progress] = None,
+        alert: Optional[Alert] = None,
+        sink: Optional[str | os.PathLike] = None,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None,
+        checkpoint_dir: Optional[str | os.PathLike] = None) -> ArrowDataframe | Summary: ...
+
+def dedupe(source: Source,
+        matching: Optional[Matching] = None,
+        output: Optional[list[str]] = None,
+        mirror: bool = False,
+        progress: Optional[Progress] = None,
+        alert: Optional[Alert] = None,
+        sink: Optional[str | os.PathLike] = None,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None,
+        checkpoint_dir: Optional[str | os.PathLike] = None) -> ArrowDataframe | Summary:
+    writer = sinker(os.fspath(sink), output) if sink is not None else None # check this first, before any matching work is done
+    govern(resources, alert)
+    measure = measurer(profile)
+    data1, data2, columnmap1, columnmap2, blocks = setup(source, None, matching, output, alert, measure)
+    for (_, fieldmap1, fieldmap2, _, _, _, _) in blocks: # each pair is only looked at one way round, so it has to compare the same either way
+        if list(fieldmap1) != list(fieldmap2): raise Exception('dedupe: fields must be matched against themselves')
+    checkpoint = checkpointer(checkpoint_dir, data1, data2, triangle=True)
+    matches = match(data1, data2, blocks, progress, alert, triangle=True, profile=profile, resources=resources, checkpoint=checkpoint) # each pair only once, never a row with itself
+    if mirror: matches = polars.concat([matches, matches.rename({'_data1_id': '_data2_id', '_data2_id': '_data1_id'}).select(matches.columns)])
+    with measure('supplement') as record:
+        outputs = supplement('inner', data1, data2, matches)
+        record.update(rows_in=len(matches), rows_out=len(outputs))
+    return deliver(outputs, columnmap1, columnmap2, output, alert, writer, sink, measure)
+
+def prepare(source: Source, name: Optional[str] = None) -> Prepared:
+    data = use(source)
+    columns = data.collect_schema().names()
+    if len(columns) != len(set(columns)): raise Exception(f'{name}: dataset has duplicate headers' if name else 'dataset has duplicate headers')
+    data, columnmap = disambiguate(data, 'prepared')
+    return Prepared(name, data.collect(), columnmap, {})
+
+@overload
+async def run_async(source1: Source,
+        source2: Source,
+        matching: Optional[Matching] = None,
+        output: Optional[list[str]] = None,
+        join: str = 'inner',
+        progress: Optional[Progress] = None,
+        alert: Optional[Alert] = None,
+        sink: None = None,
+        auto_block: bool = False,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None,
+        checkpoint_dir: Optional[str | os.PathLike] = None,
+        deadline: Optional[float] = None,
+        executor: Optional[concurrent.futures.ThreadPoolExecutor] = None) -> ArrowDataframe: ...
+
+@overload
+async def run_async(source1: Source,
+        source2: Source,
+        matching: Optional[Matching] = None,
+        output: Optional[list[str]] = None,
+        join: str = 'inner',
+        progress: Optional[Progress] = None,
+        alert: Optional[Alert] = None,
+        sink: str | os.PathLike = ...,
+        auto_block: bool = False,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None,
+        checkpoint_dir: Optional[str | os.PathLike] = None,
+        deadline: Optional[float] = None,
+        executor: Optional[concurrent.futures.ThreadPoolExecutor] = None) -> Summary: ...
+
+@overload
+async def run_async(source1: Source,
+        source2: Source,
+        matching: Optional[Matching] = None,
+        output: Optional[list[str]] = None,
+        join: str = 'inner',
+        progress: Optional[Progress] = None,
+        alert: Optional[Alert] = None,
+        sink: Optional[str | os.PathLike] = None,
+        auto_block: bool = False,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None,
+        checkpoint_dir: Optional[str | os.PathLike] = None,
+        deadline: Optional[float] = None,
+        executor: Optional[concurrent.futures.ThreadPoolExecutor] = None) -> ArrowDataframe | Summary: ...
+
+async def run_async(source1: Source,
+        source2: Source,
+        matching: Optional[Matching] = None,
+        output: Optional[list[str]] = None,
+        join: str = 'inner',
+        progress: Optional[Progress] = None,
+        alert: Optional[Alert] = None,
+        sink: Optional[str | os.PathLike] = None,
+        auto_block: bool = False,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None,
+        checkpoint_dir: Optional[str | os.PathLike] = None,
+        deadline: Optional[float] = None,
+        executor: Optional[concurrent.futures.ThreadPoolExecutor] = None) -> ArrowDataframe | Summary:
+    import asyncio
+    import threading
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+    waiting: set[threading.Event] = set() # progress bars being set up on the event loop, woken early if the match is cancelled
+    def check() -> None:
+        if cancelled.is_set(): raise Cancelled()
+    # callbacks are handed back to the event loop rather than called from the worker thread, and each step of the match first checks whether it has been cancelled
+    def relay_progress(operation: str, total: int) -> Callable[[], None]:
+        check()
+        if progress is None: return check
+        ready = threading.Event()
+        ticks: list[Callable[[], None]] = []
+        def start() -> None:
+            try:
+                if not cancelled.is_set(): ticks.append(cast(Progress, progress)(operation, total))
+            finally:
+                ready.set()
+        waiting.add(ready)
+        loop.call_soon_threadsafe(start)
+        ready.wait() # so the match does not run on ahead of the loop
+        waiting.discard(ready)
+        check()
+        if not ticks: raise Exception('run: progress function failed')
+        def relayed() -> None:
+            check()
+            loop.call_soon_threadsafe(ticks[0])
+        return relayed
+    def relay_alert(message: str, *, importance: Optional[str] = None) -> None:
+        loop.call_soon_threadsafe(functools.partial(cast(Alert, alert), message, importance=importance))
+    def relay_profile(stage: Stage) -> None:
+        loop.call_soon_threadsafe(cast(Profile, profile), stage)
+    job = (executor or async_executor()).submit(run, source1, source2, matching, output, join, relay_progress, relay_alert if alert else None, sink, auto_block, relay_profile if profile else None, resources, checkpoint_dir, deadline)
+    try:
+        return await asyncio.wrap_future(job)
+    except asyncio.CancelledError:
+        cancelled.set()
+        for ready in list(waiting): ready.set()
+        raise
+
+@functools.cache
+def async_executor() -> concurrent.futures.ThreadPoolExecutor:
+    return concurrent.futures.ThreadPoolExecutor(max_workers=ASYNC_JOBS, thread_name_prefix='textmatch')
+
+def govern(resources: Optional[Resources], alert: Optional[Alert]) -> None:
+    if resources is None: return
+    for key, value in resources.items():
+        if key not in ['threads', 'memory', 'pairs']: raise Exception(f'{key}: resource not known')
+        if not isinstance(value, int) or value < 1: raise Exception(f'{key}: resource limit must be a whole number above zero')
+    threads = resources.get('threads')
+    if threads is not None and polars.thread_pool_size() > threads: # polars sets up its threads when first used, and cannot change them after that
+        if alert: alert(f'polars is using {polars.thread_pool_size()} threads, more than the limit of {threads} – set the POLARS_MAX_THREADS environment variable before polars is first used to change this', importance='warning')
+
+def checkpointer(checkpoint_dir: Optional[str | os.PathLike], data1: PolarsDataframe, data2: PolarsDataframe, triangle: bool = False) -> Optional[Checkpoint]:
+    if checkpoint_dir is None: return None
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    digest = hashlib.sha256(f'{polars.__version__} {triangle}'.encode()) # row hashes can differ between versions of polars
+    for data in [data1, data2]:
+        digest.update(json.dumps(data.columns).encode())
+        digest.update(str(data.hash_rows().implode().hash().item()).encode())
+    return os.fspath(checkpoint_dir), digest.hexdigest()
+
+def checkpoint_path(checkpoint: Checkpoint, index: int) -> str:
+    directory, fingerprint = checkpoint
+    return os.path.join(directory, f'block{index + 1}-{fingerprint[:16]}.arrow')
+
+def checkpointed(checkpoint: Checkpoint, index: int, matches: PolarsDataframe) -> None:
+    path = checkpoint_path(checkpoint, index)
+    saved(path, matches)
+    for name in os.listdir(checkpoint[0]): # the block's tiles are no longer needed once the whole block is saved
+        if name.startswith(f'{os.path.basename(path)}.tile'): os.remove(os.path.join(checkpoint[0], name))
+
+def saved(path: str, data: PolarsDataframe) -> None:
+    data.write_ipc(f'{path}.partial')
+    os.replace(f'{path}.partial', path) # only ever complete, even if interrupted while writing
+
+def deliver(
+        outputs: PolarsDataframe,
+        columnmap1: dict[str, str],
+        columnmap2: dict[str, str],
+        output: Optional[list[str]],
+        alert: Optional[Alert],
+        writer: Optional[Callable[[PolarsLazyframe], None]],
+        sink: Optional[str | os.PathLike],
+        measure: Measure) -> ArrowDataframe | Summary:
+    results = format(outputs.lazy(), columnmap1, columnmap2, output, alert)
+    with measure('format') as record: # format is lazy, so this is where its work is actually done
+        record.update(rows_in=len(outputs), rows_out=len(outputs))
+        if writer is not None:
+            writer(results)
+            return {'sink': os.fspath(cast(str, sink)), 'rows': len(outputs), 'columns': results.collect_schema().names()}
+        return results.collect().to_arrow()
+
+def measurer(profile: Optional[Profile], block: Optional[int] = None) -> Measure:
+    @contextlib.contextmanager
+    def measure(stage: str, detail: Optional[str] = None) -> Iterator[dict]:
+        record: dict = {'rows_in': None, 'rows_out': None, 'pairs': None}
+        if profile is None:
+            yield record
+            return
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        memory = peak_memory()
+        yield record
+        profile({
+            'stage': stage,
+            'block': block,
+            'detail': detail,
+            'wall': time.perf_counter() - wall,
+            'cpu': time.process_time() - cpu,
+            'memory': peak_memory() - memory,
+            'rows_in': record['rows_in'],
+            'rows_out': record['rows_out'],
+            'pairs': record['pairs']
+        })
+    return measure
+
+UNMEASURED = measurer(None) # for stages run without a profile
+
+def peak_memory() -> int:
+    if sys.platform == 'win32':
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    import resource # not available on windows
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024 # kilobytes everywhere other than macos
+
+def sweep(source1: Source,
+        source2: Source,
+        thresholds: list[float],
+        matching: Optional[Matching] = None,
+        output: Optional[list[str]] = None,
+        join: str = 'inner',
+        results: bool = False,
+        bins: int = 10,
+        progress: Optional[Progress] = None,
+        alert: Optional[Alert] = None) -> list[Sweep]:
+    if len(thresholds) == 0: raise Exception('at least one threshold must be given')
+    for threshold in thresholds:
+        if threshold < 0 or threshold > 1: raise Exception('threshold must be between 0.0 and 1.0 (inclusive)')
+    if matching is None: matching = [{}]
+    matching = [{**matchblock, 'threshold': min(thresholds)} for matchblock in matching] # score everything once, at the lowest threshold
+    data1, data2, columnmap1, columnmap2, blocks = setup(source1, source2, matching, output, alert)
+    matches = match(data1, data2, blocks, progress, alert)
+    degree = polars.min_horizontal([column for column in matches.columns if column.endswith('_degree')]) # unthresholded methods always give 1.0
+    sweeps: list[Sweep] = []
+    for threshold in sorted(thresholds):
+        selected = matches.filter(degree >= threshold)
+        histogram = selected.select((degree * bins).floor().clip(0, bins - 1).cast(polars.UInt32).alias('bin'))['bin'].value_counts()
+        counts = dict(zip(histogram['bin'].to_list(), histogram['count'].to_list()))
+        sweeps.append({
+            'threshold': threshold,
+            'matches': len(selected),
+            'histogram': [counts.get(i, 0) for i in range(bins)],
+            'results': format(supplement(join, data1, data2, selected).lazy(), columnmap1.copy(), columnmap2.copy(), output, alert).collect().to_arrow() if results else None
+        })
+    return sweeps
+
+def setup(
+        source1: Source,
+        source2: Optional[Source],
+        matching: Optional[Matching],
+        output: Optional[list[str]],
+        alert: Optional[Alert],
+        measure: Measure = UNMEASURED) -> tuple[PolarsDataframe, PolarsDataframe, dict[str, str], dict[str, str], Blocks]:
+    with measure('use', 'data1'): data1 = use(source1)
+    with measure('use', 'data2'): data2 = use(source2) if source2 is not None else data1 # one dataset matched against itself
+    with measure('disambiguate', 'data1'): data1, columnmap1 = adopt(source1, 'data1') if isinstance(source1, Prepared) else disambiguate(data1, 'data1')
+    with measure('disambiguate', 'data2'):
+        original2 = source1 if source2 is None else source2
+        data2, columnmap2 = adopt(original2, 'data2') if isinstance(original2, Prepared) else disambiguate(data2, 'data2')
+    schema1 = data1.collect_schema()
+    schema2 = data2.collect_schema()
     if matching is None: matching = [{}]
     blocks = []
     for i, matchblock in enumerate(matching):
@@ -46,16 +444,16 @@ def run(source1: Source,
         threshold = matchblock.get('threshold', 0.6)
         for field in fields1:
             if field not in columnmap1: raise Exception(f'{field}: field not found')
-            if data1.schema[columnmap1[field]] != polars.String: raise Exception(f'{field}: field is not a string')
+            if schema1[columnmap1[field]] != polars.String: raise Exception(f'{field}: field is not a string')
         for field in fields2:
             if field not in columnmap2: raise Exception(f'{field}: field not found')
-            if data2.schema[columnmap2[field]] != polars.String: raise Exception(f'{field}: field is not a string')
+            if schema2[columnmap2[field]] != polars.String: raise Exception(f'{field}: field is not a string')
         if len(fields1) != len(fields2): raise Exception('both inputs must have the same number of fields specified')
         header1 = [columnmap1[field] for field in fields1]
         header2 = [columnmap2[field] for field in fields2]
         fieldmap1 = {fields1[j]: header1[j] for j in range(len(fields1))}
         fieldmap2 = {fields2[j]: header2[j] for j in range(len(fields2))}
-        blocks.append((i, fieldmap1, fieldmap2, ignores, method, threshold))
+        blocks.append((i, fieldmap1, fieldmap2, ignores, method, threshold, matchblock))
     meta = {
         'literal': {
             'name': 'Literal',
@@ -100,110 +498,364 @@ def run(source1: Source,
     })
     if alert:
         for block in blocks:
-            (index, fieldmap1, fieldmap2, ignoreset, method, threshold) = block
+            (index, fieldmap1, fieldmap2, ignoreset, method, threshold, _) = block
             plan_index = f'({index + 1}) ' if len(blocks) > 1 else ''
             if method not in meta: raise Exception(f'{method}: method does not exist')
             plan_method = meta[method]['name'] + (f' {threshold}' if meta[method]['thresholded'] else '')
             plan_ignore = ' – ignoring ' + ', '.join(ignoreset) if len(ignoreset) > 0 else ''
             plan_fields = ', '.join(f'"{a}" × "{b}"' for a, b in zip(fieldmap1.keys(), fieldmap2.keys()))
             alert(f'{plan_index}{plan_method} match{plan_ignore}: {plan_fields}')
-    matches = match(data1, data2, blocks, progress, alert)
-    outputs = supplement(join, data1, data2, matches)
-    results = format(outputs, columnmap1, columnmap2, output, alert)
-    return results.to_arrow()
-
-def use(source: Source) -> PolarsDataframe:
-    form = str(type(source)).split('\'')[1]
-    if form == 'dict':
-        return polars.from_dict(cast(dict, source))
-    elif form == 'polars.dataframe.frame.DataFrame':
-        return cast(PolarsDataframe, source)
-    elif form == 'pyarrow.lib.Table':
-        return cast(PolarsDataframe, polars.from_arrow(source))
-    elif form == 'pandas.core.frame.DataFrame':
-        return polars.from_pandas(cast(PandasDataframe, source))
+    headers1, headers2 = projection(blocks, columnmap1, columnmap2, output)
+    if source2 is None: # only read in once, then mirror it
+        headers = [header for header in columnmap1.values() if header in headers1 or header.replace('_data1_', '_data2_', 1) in headers2]
+        with measure('read', 'data1') as record:
+            data1 = data1.select('_data1_id', *headers).collect()
+            record.update(rows_out=len(data1))
+        if isinstance(source1, Prepared): data1 = prepared_ignorance(data1, source1, [(index, fieldmap1, ignores) for index, fieldmap1, _, ignores, *_ in blocks], 'data1')
+        data2 = data1.rename(lambda column: column.replace('_data1_', '_data2_', 1)).select('_data2_id', *headers2)
+        return data1, data2, columnmap1, columnmap2, blocks
+    with measure('read', 'data1') as record:
+        data1 = data1.select('_data1_id', *headers1).collect()
+        record.update(rows_out=len(data1))
+    with measure('read', 'data2') as record:
+        data2 = data2.select('_data2_id', *headers2).collect()
+        record.update(rows_out=len(data2))
+    if isinstance(source1, Prepared): data1 = prepared_ignorance(data1, source1, [(index, fieldmap1, ignores) for index, fieldmap1, _, ignores, *_ in blocks], 'data1')
+    if isinstance(source2, Prepared): data2 = prepared_ignorance(data2, source2, [(index, fieldmap2, ignores) for index, _, fieldmap2, ignores, *_ in blocks], 'data2')
+    return data1, data2, columnmap1, columnmap2, blocks
+
+def autoblock(
+        data1: PolarsDataframe,
+        data2: PolarsDataframe,
+        blocks: Blocks,
+        alert: Optional[Alert]) -> tuple[PolarsDataframe, PolarsDataframe, Blocks]:
+    compared = ['damerau-levenshtein', 'edit', 'ratcliff-obershelp', 'partial-ratcliff-obershelp', 'tokenset-ratcliff-obershelp', 'tokenset-partial-ratcliff-obershelp', 'jaro-winkler']
+    if any(method not in compared for (_, _, _, _, method, _, _) in blocks):
+        if alert: alert('automatic blocking is only used when every match block uses a compared method', importance='warning')
+        return data1, data2, blocks
+    (index, fieldmap1, fieldmap2, ignores, _, _, _) = blocks[0]
+    field1, header1 = next(iter(fieldmap1.items()))
+    field2, header2 = next(iter(fieldmap2.items()))
+    sample1 = data1.sample(min(max(1, SAMPLE_PAIRS // max(1, len(data2))), len(data1)), seed=0).sort('_data1_id') # all of the second, as two independent samples of sparse data would hardly ever share a match
+    truth = match(sample1, data2, blocks, None, None).select('_data1_id', '_data2_id') # brute force over the sample
+    if len(truth) == 0:
+        if alert: alert('automatic blocking found no matches in a sample of the data to learn from, so will not be used', importance='warning')
+        return data1, data2, blocks
+    def keyed(data, header, name, key):
+        header_ignorant = f'_block{index}{header}_ignorant'
+        return ignorance(data, header, ignores, index).with_columns(key(polars.col(header_ignorant)).alias(name)).drop(header_ignorant)
+    best = None
+    for description, key in autoblock_keys().items():
+        keys1 = keyed(sample1, header1, '_key', key).select('_data1_id', '_key')
+        keys2 = keyed(data2, header2, '_key', key).select('_data2_id', '_key')
+        kept = truth.join(keys1, on='_data1_id').join(keys2, on='_data2_id', suffix='2').filter(polars.col('_key') == polars.col('_key2'))
+        recall = len(kept) / len(truth)
+        pairs = keys1.group_by('_key').len('_count1').join(keys2.group_by('_key').len('_count2'), on='_key').select((polars.col('_count1').cast(polars.UInt64) * polars.col('_count2')).sum()).item()
+        proportion = pairs / (len(sample1) * len(data2))
+        if best is None or (recall, -proportion) > (best[2], -best[3]):
+            best = (description, key, recall, proportion)
+    (description, key, recall, proportion) = cast(tuple, best)
+    if alert: alert(f'automatic blocking on {description} of "{field1}" × "{field2}": estimated to keep {recall:.0%} of matches while comparing {proportion:.1%} of pairs')
+    data1 = keyed(data1, header1, '_data1_autoblock', key)
+    data2 = keyed(data2, header2, '_data2_autoblock', key)
+    blocks = [(-1, {'_autoblock': '_data1_autoblock'}, {'_autoblock': '_data2_autoblock'}, [], 'literal', 0.0, {}), *blocks] # negative index so it is never counted as a degree
+    return data1, data2, blocks
+
+def autoblock_keys() -> dict[str, Callable[[polars.Expr], polars.Expr]]:
+    from .methods import double_metaphone
+    return {
+        'first letter': lambda value: value.str.to_lowercase().str.slice(0, 1),
+        'sound of first word': lambda value: value.str.split(' ').list.first().map_elements(lambda word: double_metaphone.apply(word)[0], polars.String),
+        'start of sorted words': lambda value: value.str.to_lowercase().str.split(' ').list.sort().list.join(' ').str.slice(0, 2),
+        'length': lambda value: (value.str.len_chars() // 4).cast(polars.String)
+    }
+
+def use(source: Source) -> PolarsLazyframe:
+    if isinstance(source, Prepared):
+        return source.data.lazy()
+    elif isinstance(source, (str, os.PathLike)):
+        return scan(os.fspath(source))
+    elif isinstance(source, dict):
+        return polars.from_dict(source).lazy()
+    elif isinstance(source, polars.DataFrame):
+        return source.lazy()
+    elif isinstance(source, polars.LazyFrame):
+        return source
+    elif 'pyarrow' in sys.modules and isinstance(source, sys.modules['pyarrow'].Table): # if pyarrow has not been imported this cannot be one of its tables
+        return cast(PolarsDataframe, polars.from_arrow(source)).lazy()
+    elif 'pandas' in sys.modules and isinstance(source, sys.modules['pandas'].DataFrame): # likewise for pandas
+        import pyarrow # transitive dependency of polars
+        return cast(PolarsDataframe, polars.from_arrow(pyarrow.Table.from_pandas(source, preserve_index=False))).lazy() # arrow-backed columns are not copied
+    elif isinstance(source, ArrowStreamable): # anything that can give an Arrow stream, such as record batch readers or DuckDB relations
+        return stream(source)
+    elif isinstance(source, ArrowArrayable):
+        return polars.DataFrame(source).lazy()
     else:
         raise Exception('unknown data format')
 
-def disambiguate(data: PolarsDataframe, name: str) -> tuple[PolarsDataframe, dict[str, str]]:
-    columns = data.columns
+def stream(source: ArrowStreamable) -> PolarsLazyframe:
+    import pyarrow # transitive dependency of polars
+    reader = pyarrow.RecordBatchReader.from_stream(source)
+    schema = cast(PolarsDataframe, polars.from_arrow(reader.schema.empty_table())).schema
+    read = False
+    def batches(with_columns: Optional[list[str]], predicate: Optional[polars.Expr], n_rows: Optional[int], batch_size: Optional[int]) -> Iterator[PolarsDataframe]:
+        nonlocal read
+        if read: raise Exception('stream has already been read, and can only be read once') # otherwise it would quietly give no rows
+        read = True
+        # read a batch at a time, only keeping the columns that are needed
+        for batch in reader:
+            data = cast(PolarsDataframe, polars.from_arrow(batch))
+            if with_columns is not None: data = data.select(with_columns)
+            if predicate is not None: data = data.filter(predicate)
+            if n_rows is not None:
+                data = data.head(n_rows)
+                n_rows -= len(data)
+            yield data
+            if n_rows == 0: break
+    return polars.io.plugins.register_io_source(batches, schema=schema)
+
+def scan(path: str) -> PolarsLazyframe:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ['.parquet', '.pq']:
+        return polars.scan_parquet(path)
+    elif extension in ['.arrow', '.ipc', '.feather']:
+        return polars.scan_ipc(path, memory_map=True)
+    elif extension in ['.csv', '.tsv']:
+        return polars.scan_csv(path, separator='\t' if extension == '.tsv' else ',', infer_schema=False) # everything as text, as that is what gets matched
+    elif extension in ['.ndjson', '.jsonl']:
+        return polars.scan_ndjson(path)
+    else:
+        raise Exception(f'{path}: unknown file format')
+
+def sinker(path: str, output: Optional[list[str]] = None) -> Callable[[PolarsLazyframe], None]:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ['.parquet', '.pq']:
+        return lambda results: results.sink_parquet(path)
+    elif extension in ['.arrow', '.ipc', '.feather']:
+        return lambda results: results.sink_ipc(path)
+    elif extension in ['.csv', '.tsv']:
+        if output is not None and 'degrees' in output: raise Exception(f'{path}: degrees is a list, which cannot be written to {extension[1:].upper()}, so use degree instead')
+        return lambda results: results.sink_csv(path, separator='\t' if extension == '.tsv' else ',')
+    else:
+        raise Exception(f'{path}: unknown file format')
+
+def disambiguate(data: PolarsLazyframe, name: str) -> tuple[PolarsLazyframe, dict[str, str]]:
+    columns = data.collect_schema().names()
     if len(columns) != len(set(columns)):
         number = 'first' if name == 'data1' else 'second'
         raise Exception(f'{number} dataset has duplicate headers')
     columnlist = [(column, f'_{name}_col{i}') for i, column, in enumerate(columns)]
-    for column, identifier in columnlist:
-        data = data.rename({column: identifier})
+    data = data.rename(dict(columnlist))
     data = data.with_row_index(f'_{name}_id')
     return data, dict(columnlist)
 
+def adopt(prepared: Prepared, name: str) -> tuple[PolarsLazyframe, dict[str, str]]:
+    # already read in and disambiguated, so only the names need to change to say which side it is on
+    data = prepared.data.lazy().rename(lambda column: column.replace('_prepared_', f'_{name}_', 1))
+    columnmap = {column: header.replace('_prepared_', f'_{name}_', 1) for column, header in prepared.columnmap.items()}
+    return data, columnmap
+
+def prepared_ignorance(
+        data: PolarsDataframe,
+        prepared: Prepared,
+        blocks: list[tuple[int, dict[str, str], list[str]]],
+        name: str) -> PolarsDataframe:
+    # normalised columns are worked out once for the whole dataset, then reused by every run it is given to
+    for index, fieldmap, ignores in blocks:
+        for header in fieldmap.values():
+            original = header.replace(f'_{name}_', '_prepared_', 1)
+            key = (original, tuple(ignores))
+            if key not in prepared.ignorant:
+                prepared.ignorant[key] = ignorance(prepared.data.select(original), original, ignores, index)[f'_block{index}{original}_ignorant']
+            data = data.with_columns(prepared.ignorant[key].alias(f'_block{index}{header}_ignorant'))
+    return data
+
+def projection(
+        blocks: Blocks,
+        columnmap1: dict[str, str],
+        columnmap2: dict[str, str],
+        output: Optional[list[str]]) -> tuple[list[str], list[str]]:
+    # only the columns that are matched on or output need to be read in
+    if output is None: return list(columnmap1.values()), list(columnmap2.values())
+    needed1 = {header for block in blocks for header in block[1].values()}
+    needed2 = {header for block in blocks for header in block[2].values()}
+    for definition in output:
+        if definition == '1*': needed1.update(columnmap1.values())
+        elif definition == '2*': needed2.update(columnmap2.values())
+        elif definition.startswith('1.') and definition[2:] in columnmap1: needed1.add(columnmap1[definition[2:]])
+        elif definition.startswith('2.') and definition[2:] in columnmap2: needed2.add(columnmap2[definition[2:]])
+    headers1 = [header for header in columnmap1.values() if header in needed1]
+    headers2 = [header for header in columnmap2.values() if header in needed2]
+    return headers1, headers2
+
+def match_deadline(
+        data1: PolarsDataframe,
+        data2: PolarsDataframe,
+        blocks: Blocks,
+        progress: Optional[Progress],
+        alert: Optional[Alert],
+        end: float,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None) -> tuple[PolarsDataframe, int]:
+    # the first dataset is matched a slice at a time, in order, until time runs out
+    def timed(operation: str, total: int) -> Callable[[], None]:
+        if time.perf_counter() > end: raise DeadlineReached()
+        tick = progress(operation, total) if progress else None
+        def timed_tick() -> None:
+            if time.perf_counter() > end: raise DeadlineReached() # give up on the slice part way through
+            if tick: tick()
+        return timed_tick
+    everything = blocks
+    pairs_limit = (resources or {}).get('pairs')
+    (index, _, _, _, method, *_) = blocks[0]
+    parent = None
+    if method in ['literal', 'double-metaphone', 'phonetic']: # key counts, fanout, and common values depend on the whole of the first dataset, so that block is done in one go
+        try:
+            parent = match(data1, data2, blocks[:1], timed, alert, profile=profile, resources=resources)
+            blocks = blocks[1:]
+            if len(blocks) == 0: return parent, len(data1)
+        except DeadlineReached:
+            end = 0 # no time left for any slices
+    used = 0 # pairs from the first block count against the limit across every slice
+    def counted(stage: Stage) -> None:
+        nonlocal used
+        if stage['stage'] == 'pairs' and stage['block'] == 1 and stage['pairs']: used += stage['pairs']
+        if profile: profile(stage)
+    matched = []
+    examined = 0
+    size = DEADLINE_ROWS
+    while examined < len(data1) and time.perf_counter() < end:
+        tile = data1.slice(examined, size)
+        started = time.perf_counter()
+        try:
+            if parent is not None:
+                within = parent.join(tile.select('_data1_id'), on='_data1_id', how='semi')
+                if len(within) > 0: matched.append(match(tile, data2, blocks, timed, alert, within, profile=profile, resources=resources))
+            else:
+                matched.append(match(tile, data2, blocks, timed, alert, profile=counted, resources=resources))
+                if pairs_limit is not None and used > pairs_limit: raise Exception(f'match block ({index + 1}) produced {used:,} pairs from the first {examined + len(tile):,} rows, more than the limit of {pairs_limit:,}')
+        except DeadlineReached:
+            break
+        examined += len(tile)
+        rate = len(tile) / max(time.perf_counter() - started, 1e-6)
+        size = max(1, min(size * 2, int(rate * (end - time.perf_counter())))) # grow while it is quick, but not past what should fit in the time left
+    if examined < len(data1):
+        if alert: alert(f'deadline reached with {examined:,} of {len(data1):,} rows from the first dataset matched, so some matches may be missing', importance='warning')
+    matched = [matches for matches in matched if len(matches) > 0] # an empty slice may have stopped before its last block
+    if len(matched) > 0: return polars.concat(matched), examined
+    degrees = {f'_block{index}_degree': polars.Float32 for index, *_ in everything}
+    return polars.DataFrame(schema={'_data1_id': polars.UInt32, '_data2_id': polars.UInt32, **degrees}), examined
+
 def match(
         data1: PolarsDataframe,
         data2: PolarsDataframe,
         blocks: Blocks,
         progress: Optional[Progress],
         alert: Optional[Alert],
-        parent: Optional[PolarsDataframe] = None) -> PolarsDataframe:
+        parent: Optional[PolarsDataframe] = None,
+        triangle: bool = False,
+        profile: Optional[Profile] = None,
+        resources: Optional[Resources] = None,
+        checkpoint: Optional[Checkpoint] = None) -> PolarsDataframe:
     if len(blocks) == 0:
         if parent is None: raise Exception('nothing to match') # should never happen
         return parent # exit recursion
-    (index, fieldmap1, fieldmap2, ignores, method, threshold) = blocks[0]
+    (index, fieldmap1, fieldmap2, ignores, method, threshold, matchblock) = blocks[0]
     if threshold < 0 or threshold > 1:
         raise Exception('threshold must be between 0.0 and 1.0 (inclusive)')
-    if parent is not None: # filter down to only rows which are contained within the parent
-        parent_data1_ids = parent.select('_data1_id').unique('_data1_id')
-        parent_data2_ids = parent.select('_data2_id').unique('_data2_id')
-        data1 = parent_data1_ids.join(data1, on='_data1_id', how='left')
-        data2 = parent_data2_ids.join(data2, on='_data2_id', how='left')
-    for header in fieldmap1.values(): data1 = ignorance(data1, header, ignores, index)
-    for header in fieldmap2.values(): data2 = ignorance(data2, header, ignores, index)
+    if checkpoint is not None: # each block's fingerprint covers the data and every block up to and including it
+        directory, fingerprint = checkpoint
+        checkpoint = directory, hashlib.sha256(f'{fingerprint} {json.dumps(blocks[0], default=str)}'.encode()).hexdigest()
+        path = checkpoint_path(checkpoint, index)
+        if os.path.exists(path):
+            if alert: alert(f'match block ({index + 1}) was already done, using {path}')
+            resumed = polars.read_ipc(path, memory_map=False)
+            if len(resumed) == 0: return resumed
+            return match(data1, data2, blocks[1:], progress, alert, resumed, triangle, profile, resources, checkpoint)
+    measure = measurer(profile, index + 1)
+    within = parent.select('_data1_id', '_data2_id') if parent is not None else None # only these pairs need to be looked at
+    if triangle: # both sides are the same dataset, so only work out ignorance once, then mirror it
+        if parent is not None:
+            ids = polars.concat([parent.select('_data1_id'), parent.select(polars.col('_data2_id').alias('_data1_id'))]).unique()
+            data1 = data1.join(ids, on='_data1_id', how='semi')
+        headers = {header: field for field, header in fieldmap1.items()} | {header.replace('_data2_', '_data1_', 1): field for field, header in fieldmap2.items() if header.replace('_data2_', '_data1_', 1) not in fieldmap1.values()}
+        for header, field in headers.items(): data1 = ignorance(data1, header, ignores, index, measure, field)
+        data2 = data1.rename(lambda column: column.replace('_data1_', '_data2_', 1))
+    else:
+        if parent is not None: # filter down to only rows which are contained within the parent
+            data1 = data1.join(parent.select('_data1_id'), on='_data1_id', how='semi')
+            data2 = data2.join(parent.select('_data2_id'), on='_data2_id', how='semi')
+        for field, header in fieldmap1.items(): data1 = ignorance(data1, header, ignores, index, measure, f'1.{field}')
+        for field, header in fieldmap2.items(): data2 = ignorance(data2, header, ignores, index, measure, f'2.{field}')
+    aggregate = matchblock.get('aggregate')
+    if aggregate is not None and aggregate not in ['minimum', 'mean']: raise Exception(f'{aggregate}: aggregation not known')
+    weights = [field.get('weight', 1.0) for field in matchblock.get('fields', [])] or [1.0] * len(fieldmap1)
+    if any(weight <= 0 for weight in weights): raise Exception('field weights must be more than zero')
+    limits = resources or {}
+    threads = limits.get('threads')
+    parallel = threads is None or threads > 1 # kernels split their work across the polars threads
+    workers = matchblock.get('workers', threads)
+    if threads is not None and workers is not None: workers = min(workers, threads)
+    pairs_limit = limits.get('pairs')
+    memory_limit = limits.get('memory')
     progress_text = f'{method.capitalize()} matching...' if parent is None and len(blocks) == 1 else f'({index + 1}) {method.capitalize()} matching...'
+    if index < 0: progress_text = 'Automatic blocking...'
     def ticker(total: int) -> Optional[Callable[[], None]]:
         if progress is None: return None
         return progress(progress_text, total)
     match method:
         case 'literal':
-            matches = match_apply(None, data1, data2, fieldmap1, fieldmap2, index, ticker)
+            matches = match_apply(None, data1, data2, fieldmap1, fieldmap2, index, ticker, alert, matchblock.get('stopkeys', []), matchblock.get('fanout'), triangle, measure, within, pairs_limit, memory_limit)
         case 'damerau-levenshtein' | 'edit':
             from .methods import damerau_levenshtein
-            function = damerau_levenshtein.compare
-            matches = match_compare(function, data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert)
+            function = functools.partial(damerau_levenshtein.compare, parallel=parallel)
+            candidates = damerau_levenshtein.candidates
+            matches = match_compare(function, data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert, candidates, aggregate=aggregate, weights=weights, triangle=triangle, measure=measure, within=within, pairs_limit=pairs_limit, memory_limit=memory_limit, checkpoint=checkpoint)
         case 'ratcliff-obershelp':
             from .methods import ratcliff_obershelp
             function = ratcliff_obershelp.compare
-            matches = match_compare(function, data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert)
+            matches = match_compare(function, data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert, aggregate=aggregate, weights=weights, triangle=triangle, measure=measure, within=within, pairs_limit=pairs_limit, memory_limit=memory_limit, checkpoint=checkpoint)
         case 'partial-ratcliff-obershelp':
             from .methods import partial_ratcliff_obershelp
             function = partial_ratcliff_obershelp.compare
-            matches = match_compare(function, data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert)
+            candidates = partial_ratcliff_obershelp.candidates
+            matches = match_compare(function, data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert, candidates, aggregate=aggregate, weights=weights, triangle=triangle, measure=measure, within=within, pairs_limit=pairs_limit, memory_limit=memory_limit, checkpoint=checkpoint)
         case 'tokenset-ratcliff-obershelp':
             from .methods import tokenset_ratcliff_obershelp
             function = tokenset_ratcliff_obershelp.compare
-            matches = match_compare(function, data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert)
+            matches = match_compare(function, data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert, aggregate=aggregate, weights=weights, triangle=triangle, measure=measure, within=within, pairs_limit=pairs_limit, memory_limit=memory_limit, checkpoint=checkpoint)
         case 'tokenset-partial-ratcliff-obershelp':
             from .methods import tokenset_partial_ratcliff_obershelp
             function = tokenset_partial_ratcliff_obershelp.compare
-            matches = match_compare(function, data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert)
+            matches = match_compare(function, data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert, aggregate=aggregate, weights=weights, triangle=triangle, measure=measure, within=within, pairs_limit=pairs_limit, memory_limit=memory_limit, checkpoint=checkpoint)
         case 'jaro-winkler':
             from .methods import jaro_winkler
-            function = jaro_winkler.compare
-            matches = match_compare(function, data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert)
+            function = functools.partial(jaro_winkler.compare, parallel=parallel)
+            matches = match_compare(function, data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert, aggregate=aggregate, weights=weights, triangle=triangle, measure=measure, within=within, pairs_limit=pairs_limit, memory_limit=memory_limit, checkpoint=checkpoint)
         case 'double-metaphone' | 'phonetic':
             from .methods import double_metaphone
             function = double_metaphone.apply
-            matches = match_apply_double(function, data1, data2, fieldmap1, fieldmap2, index, ticker)
+            matches = match_apply_double(function, data1, data2, fieldmap1, fieldmap2, index, ticker, alert, matchblock.get('stopkeys', []), matchblock.get('fanout'), triangle, measure, within, pairs_limit, memory_limit)
         case 'bilenko':
             from .methods import bilenko
             function = bilenko.execute
-            matches = function(data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert)
+            with measure('bilenko') as record:
+                matches = function(data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert, matchblock.get('model'), matchblock.get('training'), matchblock.get('disk', False), workers)
+                record.update(rows_in=len(data1) + len(data2), rows_out=len(matches))
+            if triangle: matches = matches.filter(polars.col('_data1_id') < polars.col('_data2_id'))
         case _:
             raise Exception(f'{method}: method does not exist')
-    if len(matches) == 0: return matches # exit early
-    block_id = f'_block{index}_id'
-    parent_block_id = f'_block{index - 1}_id'
-    parent_block_degree = f'_block{index - 1}_degree'
-    matches = matches.with_columns(polars.format('{}-{}', '_data1_id', '_data2_id').alias(block_id))
-    child = matches.join(parent.select(polars.col([parent_block_id, parent_block_degree])), left_on=block_id, right_on=parent_block_id, how='inner') if parent is not None else matches
-    return match(data1, data2, blocks[1:], progress, alert, child) # recursion
+    matches = matches.select('_data1_id', '_data2_id', f'_block{index}_degree') # only carry ids and degrees between blocks, the data is added back at the end
+    if len(matches) == 0:
+        if checkpoint is not None: checkpointed(checkpoint, index, matches)
+        return matches # exit early
+    if parent is not None: # only keep pairs which also matched in the parent, carrying along the degrees from there
+        parent_degrees = [column for column in parent.columns if column.endswith('_degree')]
+        child = matches.join(parent.select('_data1_id', '_data2_id', *parent_degrees), on=['_data1_id', '_data2_id'], how='inner', maintain_order='left')
+    else:
+        child = matches
+    if checkpoint is not None: checkpointed(checkpoint, index, child)
+    return match(data1, data2, blocks[1:], progress, alert, child, triangle, profile, resources, checkpoint) # recursion
 
 def match_apply(
         function: Optional[Callable[[str], str]],
@@ -212,7 +864,15 @@ def match_apply(
         fieldmap1: dict[str, str],
         fieldmap2: dict[str, str],
         index: int,
-        ticker: Ticker) -> PolarsDataframe:
+        ticker: Ticker,
+        alert: Optional[Alert],
+        stopkeys: list[str],
+        fanout: Optional[int],
+        triangle: bool = False,
+        measure: Measure = UNMEASURED,
+        within: Optional[PolarsDataframe] = None,
+        pairs_limit: Optional[int] = None,
+        memory_limit: Optional[int] = None) -> PolarsDataframe:
     tick = ticker(2) # no way to do this live, so just have two ticks, before and after the join
     def application(data, header_ignorant, header_applied):
         if function is None: return data.with_columns(polars.col(header_ignorant).alias(header_applied))
@@ -222,13 +882,20 @@ def match_apply(
     headerset2_ignorant = [f'_block{index}{header}_ignorant' for header in fieldmap2.values()]
     headerset1_applied = [f'_block{index}{header}_applied' for header in fieldmap1.values()]
     headerset2_applied = [f'_block{index}{header}_applied' for header in fieldmap2.values()]
-    for header_ignorant, header_applied in zip(headerset1_ignorant, headerset1_applied):
-        data1 = application(data1, header_ignorant, header_applied)
-    for header_ignorant, header_applied in zip(headerset2_ignorant, headerset2_applied):
-        data2 = application(data2, header_ignorant, header_applied)
+    data1 = unstopped(data1, headerset1_ignorant, stopkeys)
+    data2 = unstopped(data2, headerset2_ignorant, stopkeys)
+    with measure('application') as record:
+        for header_ignorant, header_applied in zip(headerset1_ignorant, headerset1_applied):
+            data1 = application(data1, header_ignorant, header_applied)
+        for header_ignorant, header_applied in zip(headerset2_ignorant, headerset2_applied):
+            data2 = application(data2, header_ignorant, header_applied)
+        record.update(rows_in=len(data1) + len(data2), rows_out=len(data1) + len(data2))
     if tick: tick()
-    joined = data2.join(data1, left_on=headerset2_applied, right_on=headerset1_applied, how='inner')
-    joined = joined.with_columns(polars.lit('1.0').alias(f'_block{index}_degree'))
+    with measure('join') as record:
+        if within is not None: joined = match_within(data1, data2, [(headerset1_applied, headerset2_applied)], within, index, alert, fanout, memory_limit)
+        else: joined = match_keyed(data1, data2, [(headerset1_applied, headerset2_applied)], index, alert, fanout, triangle, pairs_limit, memory_limit)
+        record.update(rows_in=len(data1) + len(data2), rows_out=len(joined), pairs=len(joined))
+    joined = joined.with_columns(polars.lit(1.0, polars.Float32).alias(f'_block{index}_degree'))
     if tick: tick()
     return joined
 
@@ -239,8 +906,16 @@ def match_apply_double(
         fieldmap1: dict[str, str],
         fieldmap2: dict[str, str],
         index: int,
-        ticker: Ticker) -> PolarsDataframe:
-    tick = ticker(6)
+        ticker: Ticker,
+        alert: Optional[Alert],
+        stopkeys: list[str],
+        fanout: Optional[int],
+        triangle: bool = False,
+        measure: Measure = UNMEASURED,
+        within: Optional[PolarsDataframe] = None,
+        pairs_limit: Optional[int] = None,
+        memory_limit: Optional[int] = None) -> PolarsDataframe:
+    tick = ticker(3)
     def application(data, header_ignorant, header_applied, header_applied1, header_applied2):
         data = data.with_columns(polars.col(header_ignorant).map_elements(function, polars.List(polars.String)).alias(header_applied))
         data = data.with_columns(polars.col(header_applied).list.get(0).alias(header_applied1))
@@ -254,25 +929,127 @@ def match_apply_double(
     headerset2_applied1 = [f'_block{index}{header}_applied1' for header in fieldmap2.values()]
     headerset1_applied2 = [f'_block{index}{header}_applied2' for header in fieldmap1.values()]
     headerset2_applied2 = [f'_block{index}{header}_applied2' for header in fieldmap2.values()]
-    for header_ignorant, header_applied, header_applied1, header_applied2 in zip(headerset1_ignorant, headerset1_applied, headerset1_applied1, headerset1_applied2):
-        data1 = application(data1, header_ignorant, header_applied, header_applied1, header_applied2)
-    for header_ignorant, header_applied, header_applied1, header_applied2 in zip(headerset2_ignorant, headerset2_applied, headerset2_applied1, headerset2_applied2):
-        data2 = application(data2, header_ignorant, header_applied, header_applied1, header_applied2)
-    if tick: tick()
-    joined_set_1x1 = data2.join(data1, left_on=headerset2_applied1, right_on=headerset1_applied1, how='inner')
+    data1 = unstopped(data1, headerset1_ignorant, stopkeys)
+    data2 = unstopped(data2, headerset2_ignorant, stopkeys)
+    with measure('application') as record:
+        for header_ignorant, header_applied, header_applied1, header_applied2 in zip(headerset1_ignorant, headerset1_applied, headerset1_applied1, headerset1_applied2):
+            data1 = application(data1, header_ignorant, header_applied, header_applied1, header_applied2)
+        for header_ignorant, header_applied, header_applied1, header_applied2 in zip(headerset2_ignorant, headerset2_applied, headerset2_applied1, headerset2_applied2):
+            data2 = application(data2, header_ignorant, header_applied, header_applied1, header_applied2)
+        record.update(rows_in=len(data1) + len(data2), rows_out=len(data1) + len(data2))
     if tick: tick()
-    joined_set_1x2 = data2.join(data1, left_on=headerset2_applied2, right_on=headerset1_applied1, how='inner')
-    if tick: tick()
-    joined_set_2x1 = data2.join(data1, left_on=headerset2_applied1, right_on=headerset1_applied2, how='inner')
-    if tick: tick()
-    joined_set_2x2 = data2.join(data1, left_on=headerset2_applied2, right_on=headerset1_applied2, how='inner')
+    keysets = [
+        (headerset1_applied1, headerset2_applied1),
+        (headerset1_applied1, headerset2_applied2),
+        (headerset1_applied2, headerset2_applied1),
+        (headerset1_applied2, headerset2_applied2)
+    ]
+    with measure('join') as record:
+        if within is not None:
+            joined = match_within(data1, data2, keysets, within, index, alert, fanout, memory_limit)
+            record.update(rows_in=len(within), rows_out=len(joined), pairs=len(within))
+        else:
+            joined = match_keyed(data1, data2, keysets, index, alert, fanout, triangle, pairs_limit, memory_limit)
+            record.update(rows_in=len(data1) + len(data2), rows_out=len(joined), pairs=len(joined))
     if tick: tick()
-    joined_sets = [joined_set_1x1, joined_set_1x2, joined_set_2x1, joined_set_2x2]
-    joined = polars.concat(joined_sets, how='diagonal').unique(['_data1_id', '_data2_id'])
-    joined = joined.with_columns(polars.lit('1.0').alias(f'_block{index}_degree'))
+    joined = joined.with_columns(polars.lit(1.0, polars.Float32).alias(f'_block{index}_degree'))
     if tick: tick()
     return joined
 
+def match_within(
+        data1: PolarsDataframe,
+        data2: PolarsDataframe,
+        keysets: list[tuple[list[str], list[str]]],
+        within: PolarsDataframe,
+        index: int,
+        alert: Optional[Alert],
+        fanout: Optional[int] = None,
+        memory_limit: Optional[int] = None) -> PolarsDataframe:
+    headers1 = list(dict.fromkeys(header for keys1, _ in keysets for header in keys1))
+    headers2 = list(dict.fromkeys(header for _, keys2 in keysets for header in keys2))
+    budget_memory(len(within) * pair_size(data1.select('_data1_id', *headers1), data2.select('_data2_id', *headers2)), index, alert, memory_limit)
+    pairs = within.join(data1.select('_data1_id', *headers1), on='_data1_id', how='inner', maintain_order='left')
+    pairs = pairs.join(data2.select('_data2_id', *headers2), on='_data2_id', how='inner', maintain_order='left')
+    equal = polars.any_horizontal([polars.all_horizontal([polars.col(header1) == polars.col(header2) for header1, header2 in zip(keys1, keys2)]) for keys1, keys2 in keysets])
+    pairs = pairs.filter(equal)
+    if fanout is None: return pairs.select('_data1_id', '_data2_id')
+    keys = [f'_key{i}' for i in range(len(keysets[0][0]))] # the values each pair shares, counted up so a value with too many pairs can be dropped as it would be in a first block
+    shared = polars.concat([pairs.filter(polars.all_horizontal([polars.col(header1) == polars.col(header2) for header1, header2 in zip(keys1, keys2)])).select('_data1_id', '_data2_id', *[polars.col(header).alias(key) for header, key in zip(keys1, keys)]) for keys1, keys2 in keysets]).unique()
+    counts = shared.group_by(keys).len('_pairs')
+    capped = counts.filter(polars.col('_pairs') > fanout)
+    if len(capped) == 0: return pairs.select('_data1_id', '_data2_id')
+    if alert: alert(f'match block ({index + 1}) is ignoring values which would each produce more than {fanout:,} pairs: {describe_keys(capped, keys)}', importance='warning')
+    kept = shared.join(capped.select(keys), on=keys, how='anti').select('_data1_id', '_data2_id').unique()
+    return pairs.select('_data1_id', '_data2_id').join(kept, on=['_data1_id', '_data2_id'], how='semi', maintain_order='left')
+
+def unstopped(data: PolarsDataframe, headers_ignorant: list[str], stopkeys: list[str]) -> PolarsDataframe:
+    if len(stopkeys) == 0: return data
+    return data.filter(~polars.any_horizontal([polars.col(header).is_in(stopkeys) for header in headers_ignorant]))
+
+def match_keyed(
+        data1: PolarsDataframe,
+        data2: PolarsDataframe,
+        keysets: list[tuple[list[str], list[str]]],
+        index: int,
+        alert: Optional[Alert],
+        fanout: Optional[int],
+        triangle: bool = False,
+        pairs_limit: Optional[int] = None,
+        memory_limit: Optional[int] = None) -> PolarsDataframe:
+    # pairs with equal values for any of the sets of keys, which are all counted up first so each alert or limit covers the whole block
+    keys = [f'_key{i}' for i in range(len(keysets[0][0]))]
+    variants1 = list(dict.fromkeys(tuple(headers1) for headers1, _ in keysets)) # the sets of keys pair every variant on one side with every variant on the other, so a pair matches when the rows share any value
+    variants2 = list(dict.fromkeys(tuple(headers2) for _, headers2 in keysets))
+    def keying(data, id, variants):
+        keyed = polars.concat([data.select(id, *[polars.col(header).alias(key) for header, key in zip(headers, keys)]) for headers in variants]).drop_nulls(keys) # nulls never join
+        if len(variants) == 1: return keyed
+        return keyed.unique(maintain_order=True) # each value once per row, even where a row's variants are the same
+    keyed1 = keying(data1, '_data1_id', variants1)
+    keyed2 = keying(data2, '_data2_id', variants2)
+    counts1 = keyed1.group_by(keys).len('_count1')
+    counts2 = keyed2.group_by(keys).len('_count2')
+    counts = counts1.join(counts2, on=keys, how='inner').with_columns((polars.col('_count1').cast(polars.UInt64) * polars.col('_count2')).alias('_pairs'))
+    if triangle: counts = counts.with_columns(((polars.col('_count1').cast(polars.UInt64) * (polars.col('_count2') - 1)) // 2).alias('_pairs')) # each pair only once, never a row with itself
+    if fanout is not None: # drop any values which would produce more pairs than allowed
+        capped = counts.filter(polars.col('_pairs') > fanout)
+        if len(capped) > 0:
+            if alert: alert(f'match block ({index + 1}) is ignoring values which would each produce more than {fanout:,} pairs: {describe_keys(capped, keys)}', importance='warning')
+            counts = counts.filter(polars.col('_pairs') <= fanout)
+            keyed1 = keyed1.join(counts.select(keys), on=keys, how='semi')
+            keyed2 = keyed2.join(counts.select(keys), on=keys, how='semi')
+    projected = counts['_pairs'].sum()
+    if len(variants1) > 1 or len(variants2) > 1: projected -= paired_twice(keyed1, keyed2, keys, triangle) # rows sharing two values are counted under each of them
+    if pairs_limit is not None and projected > pairs_limit: raise Exception(f'match block ({index + 1}) is projected to produce {projected:,} pairs, more than the limit of {pairs_limit:,}')
+    budget_memory(projected * 8, index, alert, memory_limit) # each pair is a 32-bit id from either side
+    hot = counts.filter(polars.col('_pairs') > HOT_PAIRS)
+    if len(hot) > 0 and alert:
+        proportion = min(hot['_pairs'].sum() / projected, 1.0)
+        alert(f'match block ({index + 1}) is projected to produce {projected:,} pairs, {proportion:.0%} of them from {len(hot):,} common values: {describe_keys(hot, keys)}', importance='warning')
+    if not triangle:
+        joined = keyed2.join(keyed1, on=keys, how='inner').select('_data1_id', '_data2_id')
+    else:
+        keyed2 = keyed2.rename({key: f'{key}_2' for key in keys})
+        equalities = [polars.col(key) == polars.col(f'{key}_2') for key in keys]
+        joined = keyed1.join_where(keyed2, *equalities, polars.col('_data1_id') < polars.col('_data2_id')).select('_data1_id', '_data2_id').sort('_data2_id', '_data1_id')
+    if len(variants1) == 1 and len(variants2) == 1: return joined
+    return joined.unique(['_data1_id', '_data2_id']).sort('_data2_id', '_data1_id')
+
+def paired_twice(keyed1: PolarsDataframe, keyed2: PolarsDataframe, keys: list[str], triangle: bool = False) -> int:
+    # rows have at most two values, so a pair is only counted twice where both rows have the same two
+    def doubles(keyed, id, count):
+        values = keyed.with_columns(polars.concat_str(keys, separator='\x1f').alias('_value'))
+        values = values.group_by(id).agg(polars.col('_value').min().alias('_low'), polars.col('_value').max().alias('_high'), polars.len().alias('_values'))
+        return values.filter(polars.col('_values') == 2).group_by('_low', '_high').len(count)
+    counts = doubles(keyed1, '_data1_id', '_count1').join(doubles(keyed2, '_data2_id', '_count2'), on=['_low', '_high'], how='inner')
+    if triangle: return counts.select(polars.col('_count1').cast(polars.UInt64) * (polars.col('_count2') - 1) // 2).sum().item()
+    return counts.select(polars.col('_count1').cast(polars.UInt64) * polars.col('_count2')).sum().item()
+
+def describe_keys(counts: PolarsDataframe, keys: list[str], limit: int = 3) -> str:
+    counts = counts.sort('_pairs', descending=True)
+    top = counts.head(limit)
+    values = [', '.join(f'"{value}"' for value in row) for row in top.select(keys).iter_rows()]
+    return '; '.join(values) + ('...' if len(counts) > limit else '')
+
 def match_compare(
         function: Callable[[PolarsDataframe, str, str, str], PolarsDataframe],
         data1: PolarsDataframe,
@@ -282,43 +1059,169 @@ def match_compare(
         threshold: float,
         index: int,
         ticker: Ticker,
-        alert: Optional[Alert]) -> PolarsDataframe:
-    data1_size = data1.estimated_size()
-    data2_size = data2.estimated_size()
-    estimated_memory = (data1_size * len(data2)) + (data2_size * len(data1))
-    system_memory = psutil.virtual_memory().total
-    if estimated_memory > system_memory * 0.5:
-        if alert: alert(f'match block ({index + 1}) is estimated to use {estimated_memory / 1024**3:.1f}GB of memory, more than half the system memory ({system_memory / 1024**3:.1f}GB)'.replace('.0', ''), importance='warning')
-    tick = ticker(4)
+        alert: Optional[Alert],
+        candidates: Optional[Candidates] = None,
+        aggregate: Optional[str] = None,
+        weights: Optional[list[float]] = None,
+        triangle: bool = False,
+        measure: Measure = UNMEASURED,
+        within: Optional[PolarsDataframe] = None,
+        pairs_limit: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        checkpoint: Optional[Checkpoint] = None) -> PolarsDataframe:
+    if aggregate is not None and len(fieldmap1) > 1:
+        return match_compare_fields(function, data1, data2, fieldmap1, fieldmap2, threshold, index, ticker, alert, candidates, aggregate, weights or [1.0] * len(fieldmap1), triangle, measure, within, pairs_limit, memory_limit, checkpoint)
     headerset1_ignorant = [f'_block{index}{header}_ignorant' for header in fieldmap1.values()]
     headerset2_ignorant = [f'_block{index}{header}_ignorant' for header in fieldmap2.values()]
     data1_connector = f'_block{index}_data1_connector'
     data2_connector = f'_block{index}_data2_connector'
-    data1 = data1.with_columns(polars.concat_str([polars.col(header) for header in headerset1_ignorant], separator='|').alias(data1_connector))
-    data2 = data2.with_columns(polars.concat_str([polars.col(header) for header in headerset2_ignorant], separator='|').alias(data2_connector))
+    data1 = data1.select('_data1_id', polars.concat_str([polars.col(header) for header in headerset1_ignorant], separator='|').alias(data1_connector)) # pairs only need to carry what is compared
+    data2 = data2.select('_data2_id', polars.concat_str([polars.col(header) for header in headerset2_ignorant], separator='|').alias(data2_connector))
     block_degree = f'_block{index}_degree'
-    if tick: tick()
+    with measure('pairs') as record:
+        pairs = match_pairs(data1, data2, data1_connector, data2_connector, threshold, index, alert, candidates, triangle, within, pairs_limit, memory_limit)
+        record.update(rows_in=len(data1) + len(data2), rows_out=len(pairs), pairs=len(pairs))
+    def score(tile: PolarsDataframe) -> PolarsDataframe:
+        with measure('scoring') as record:
+            tile = function(tile, data1_connector, data2_connector, block_degree)
+            matching = tile.filter(polars.col(block_degree) >= threshold).select('_data1_id', '_data2_id', block_degree)
+            record.update(rows_in=len(tile), rows_out=len(matching), pairs=len(tile))
+        return matching
+    return scored(pairs, score, index, ticker, checkpoint)
+
+def match_compare_fields(
+        function: Callable[[PolarsDataframe, str, str, str], PolarsDataframe],
+        data1: PolarsDataframe,
+        data2: PolarsDataframe,
+        fieldmap1: dict[str, str],
+        fieldmap2: dict[str, str],
+        threshold: float,
+        index: int,
+        ticker: Ticker,
+        alert: Optional[Alert],
+        candidates: Optional[Candidates],
+        aggregate: str,
+        weights: list[float],
+        triangle: bool = False,
+        measure: Measure = UNMEASURED,
+        within: Optional[PolarsDataframe] = None,
+        pairs_limit: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        checkpoint: Optional[Checkpoint] = None) -> PolarsDataframe:
+    headerset1_ignorant = [f'_block{index}{header}_ignorant' for header in fieldmap1.values()]
+    headerset2_ignorant = [f'_block{index}{header}_ignorant' for header in fieldmap2.values()]
+    total = sum(weights)
+    data1 = data1.select('_data1_id', *headerset1_ignorant) # pairs only need to carry what is compared
+    data2 = data2.select('_data2_id', *headerset2_ignorant)
+    def cost(field): # shorter text is quicker to score, and heavier weights rule out more pairs
+        _, header1, header2, weight = field
+        return ((data1[header1].str.len_chars().mean() or 0) * (data2[header2].str.len_chars().mean() or 0)) / weight
+    fields = sorted(zip(fieldmap1.keys(), headerset1_ignorant, headerset2_ignorant, weights), key=cost)
+    _, header1, header2, weight = fields[0]
+    floor = threshold if aggregate == 'minimum' else (threshold * total - (total - weight)) / weight # the least the first field can score while the pair could still reach the threshold
+    with measure('pairs') as record:
+        pairs = match_pairs(data1, data2, header1, header2, floor, index, alert, candidates if floor > 0 else None, triangle, within, pairs_limit, memory_limit)
+        record.update(rows_in=len(data1) + len(data2), rows_out=len(pairs), pairs=len(pairs))
+    block_degree = f'_block{index}_degree'
+    field_degree = f'_block{index}_field_degree'
+    def score(tile: PolarsDataframe) -> PolarsDataframe:
+        tile = tile.with_columns(polars.lit(1.0 if aggregate == 'minimum' else 0.0, polars.Float64).alias(block_degree))
+        remaining = total
+        for field, header1, header2, weight in fields:
+            with measure('scoring', f'1.{field}') as record:
+                record.update(rows_in=len(tile), pairs=len(tile))
+                tile = function(tile, header1, header2, field_degree)
+                remaining -= weight
+                if aggregate == 'minimum':
+                    tile = tile.with_columns(polars.min_horizontal(block_degree, field_degree).alias(block_degree))
+                    tile = tile.filter(polars.col(block_degree) >= threshold)
+                else:
+                    tile = tile.with_columns((polars.col(block_degree) + polars.col(field_degree) * weight).alias(block_degree))
+                    tile = tile.filter((polars.col(block_degree) + remaining) / total >= threshold) # drop pairs that could not reach the threshold even if every remaining field matched perfectly
+                tile = tile.drop(field_degree)
+                record.update(rows_out=len(tile))
+        if aggregate == 'mean': tile = tile.with_columns(polars.col(block_degree) / total)
+        tile = tile.with_columns(polars.col(block_degree).cast(polars.Float32))
+        return tile.filter(polars.col(block_degree) >= threshold).select('_data1_id', '_data2_id', block_degree)
+    return scored(pairs, score, index, ticker, checkpoint)
+
+def scored(
+        pairs: PolarsDataframe,
+        score: Callable[[PolarsDataframe], PolarsDataframe],
+        index: int,
+        ticker: Ticker,
+        checkpoint: Optional[Checkpoint] = None) -> PolarsDataframe:
+    # pairs are scored a tile at a time, and when checkpointing each tile is saved once done, so an interrupted block only does the rest again
+    tiles = range(0, max(1, len(pairs)), TILE_PAIRS) # the same tiles each time, as the pairs come out in the same order
+    tick = ticker(len(tiles))
+    matches = []
+    for number, offset in enumerate(tiles):
+        path = f'{checkpoint_path(checkpoint, index)}.tile{number + 1}' if checkpoint is not None else None
+        if path is not None and os.path.exists(path):
+            matches.append(polars.read_ipc(path, memory_map=False))
+        else:
+            matches.append(score(pairs.slice(offset, TILE_PAIRS)))
+            if path is not None: saved(path, matches[-1])
+        if tick: tick()
+    return polars.concat(matches)
+
+def match_pairs(
+        data1: PolarsDataframe,
+        data2: PolarsDataframe,
+        header1: str,
+        header2: str,
+        threshold: float,
+        index: int,
+        alert: Optional[Alert],
+        candidates: Optional[Candidates],
+        triangle: bool = False,
+        within: Optional[PolarsDataframe] = None,
+        pairs_limit: Optional[int] = None,
+        memory_limit: Optional[int] = None) -> PolarsDataframe:
+    size = pair_size(data1, data2)
+    if within is not None: # a previous block has already narrowed down the pairs
+        budget_memory(len(within) * size, index, alert, memory_limit)
+        pairs = within.join(data1, on='_data1_id', how='inner', maintain_order='left').join(data2, on='_data2_id', how='inner', maintain_order='left')
+        return pairs.select(*data1.columns, *data2.columns)
+    if threshold == 0: candidates = None # every pair gets through, so there is nothing to narrow down
+    pairs = candidates(data1, data2, header1, header2, threshold) if candidates is not None else None # only pairs the method says could reach the threshold
+    if pairs is not None:
+        if triangle: pairs = pairs.filter(polars.col('_data1_id') < polars.col('_data2_id'))
+        if pairs_limit is not None and len(pairs) > pairs_limit: raise Exception(f'match block ({index + 1}) has {len(pairs):,} candidate pairs, more than the limit of {pairs_limit:,}')
+        budget_memory(len(pairs) * size, index, alert, memory_limit)
+        pairs = pairs.join(data1, on='_data1_id', how='inner', maintain_order='left').join(data2, on='_data2_id', how='inner', maintain_order='left')
+        return pairs.select(*data1.columns, *data2.columns)
+    projected = len(data1) * (len(data1) - 1) // 2 if triangle else len(data1) * len(data2)
+    if pairs_limit is not None and projected > pairs_limit: raise Exception(f'match block ({index + 1}) is projected to produce {projected:,} pairs, more than the limit of {pairs_limit:,}')
+    budget_memory(projected * size, index, alert, memory_limit)
     pairsets = []
     for data1_id in data1['_data1_id'].to_list():
         pairset_index = f'_pairset{data1_id}'
         data2 = data2.with_columns(polars.lit(data1_id, polars.UInt32).alias(pairset_index))
-        pairset = data1.join(data2, left_on='_data1_id', right_on=pairset_index, how='inner')
+        pairset = data1.join(data2.filter(polars.col('_data2_id') > data1_id) if triangle else data2, left_on='_data1_id', right_on=pairset_index, how='inner')
         data2 = data2.drop(pairset_index)
         pairsets.append(pairset)
-    if tick: tick()
-    pairs = polars.concat(pairsets)
-    pairs = function(pairs, data1_connector, data2_connector, block_degree)
-    if tick: tick()
-    matching = pairs.filter(polars.col(block_degree) >= threshold)
-    matching = matching.with_columns(polars.col(block_degree).cast(polars.String))
-    if tick: tick()
-    return matching
+    return polars.concat(pairsets)
+
+def pair_size(data1: PolarsDataframe, data2: PolarsDataframe) -> float:
+    # bytes taken up by a pair once a row from each side is joined together
+    return data1.estimated_size() / max(1, len(data1)) + data2.estimated_size() / max(1, len(data2))
+
+def budget_memory(estimated: float, index: int, alert: Optional[Alert], memory_limit: Optional[int]) -> None:
+    if memory_limit is not None and estimated > memory_limit:
+        raise Exception(f'match block ({index + 1}) is estimated to use {estimated / 1024**3:.1f}GB of memory, more than the limit of {memory_limit / 1024**3:.1f}GB'.replace('.0', ''))
+    import psutil
+    system_memory = psutil.virtual_memory().total
+    if estimated > system_memory * 0.5:
+        if alert: alert(f'match block ({index + 1}) is estimated to use {estimated / 1024**3:.1f}GB of memory, more than half the system memory ({system_memory / 1024**3:.1f}GB)'.replace('.0', ''), importance='warning')
 
 def ignorance(
         data: PolarsDataframe,
         header: str,
         ignores: list[str],
-        index: int) -> PolarsDataframe:
+        index: int,
+        measure: Measure = UNMEASURED,
+        field: Optional[str] = None) -> PolarsDataframe:
     regex_index = ([i for i, ignore in enumerate(ignores) if ignore.startswith('regex=')] or [None])[0]
     ignores = ignores.copy()
     ignore_regex_filters = None
@@ -338,11 +1241,14 @@ def ignorance(
     for ignore in ignores:
         if ignore not in processes.keys():
             raise Exception(f'{ignore}: ignorance property not known')
-    functions = [function for name, function in processes.items() if name in ignores]
+    functions = [(name, function) for name, function in processes.items() if name in ignores]
     header_ignorant = f'_block{index}{header}_ignorant'
+    if header_ignorant in data.columns: return data # already worked out for a prepared dataset
     data = data.with_columns(polars.col(header).alias(header_ignorant))
-    for function in functions:
-        data = function(data, header_ignorant)
+    for name, function in functions:
+        with measure('ignorance', f'{field or header} {name}') as record:
+            data = function(data, header_ignorant)
+            record.update(rows_in=len(data), rows_out=len(data))
     return data
 
 def ignore_case(data: PolarsDataframe, header: str) -> PolarsDataframe:
@@ -353,6 +1259,7 @@ def ignore_nonalpha(data: PolarsDataframe, header: str) -> PolarsDataframe:
     return data.with_columns(polars.col(header).str.replace_all(regex, ' ').str.strip_chars())
 
 def ignore_nonlatin(data: PolarsDataframe, header: str) -> PolarsDataframe:
+    import unidecode
     return data.with_columns(polars.col(header).map_elements(unidecode.unidecode, polars.String))
 
 def ignore_words_leading(data: PolarsDataframe, header: str) -> PolarsDataframe:
@@ -380,7 +1287,8 @@ def supplement(
         join: str,
         data1: PolarsDataframe,
         data2: PolarsDataframe,
-        matches: PolarsDataframe) -> PolarsDataframe:
+        matches: PolarsDataframe,
+        examined: Optional[int] = None) -> PolarsDataframe:
     if join.lower() not in ['inner', 'left-outer', 'right-outer', 'full-outer']:
         raise Exception(f'{join}: join type not known')
     if join.lower() == 'full-outer' or join.lower() == 'left-outer':
@@ -391,15 +1299,22 @@ def supplement(
         data2_combination = data2.join(matches, on='_data2_id', how='left', suffix='_matches')
         unmatches_data2 = data2_combination.filter(polars.col('_data1_id').is_null()).select(matches.columns)
         matches = polars.concat([matches, unmatches_data2])
-    return matches
+    matches = matches.join(data1, on='_data1_id', how='left', maintain_order='left')
+    matches = matches.join(data2, on='_data2_id', how='left', maintain_order='left')
+    complete = polars.lit(True) if examined is None else (polars.col('_data1_id') < examined).fill_null(examined >= len(data1)) # rows only from the second dataset are complete once every row from the first has been matched
+    return matches.with_columns(complete.alias('_complete'))
 
 def format(
-        matches: PolarsDataframe,
+        matches: PolarsLazyframe,
         columnmap1: dict[str, str],
         columnmap2: dict[str, str],
         output: Optional[list[str]],
-        alert: Optional[Alert]) -> PolarsDataframe:
-    matches = matches.with_columns(polars.concat_str(polars.col([column for column in matches.columns if column.endswith('_degree')]), separator='; ').alias('_degree'))
+        alert: Optional[Alert]) -> PolarsLazyframe:
+    degree_columns = sorted([column for column in matches.collect_schema().names() if re.match(r'^_block\d+_degree$', column)], key=lambda column: int(re.sub(r'\D', '', column)))
+    matches = matches.with_columns(
+        polars.concat_list(degree_columns).alias('_degrees'), # numeric, one for each block
+        polars.concat_str(degree_columns, separator='; ').alias('_degree') # only worked out if it is output
+    )
     headerset = []
     if output is None:
         headerset = list(columnmap1.values()) + list(columnmap2.values())
@@ -423,6 +1338,10 @@ def format(
                     headerset = headerset + list(columnmap2.values())
             elif definition == 'degree': # the matching degree
                 headerset.append('_degree')
+            elif definition == 'degrees': # the matching degree for each block as a list of numbers
+                headerset.append('_degrees')
+            elif definition == 'complete': # whether every match for the row was looked for before the deadline
+                headerset.append('_complete')
             else: raise Exception('output format must be the dataset number, followed by a dot, followed by the name of the column')
     column_items = list(columnmap1.items()) + list(columnmap2.items())
     column_names = list(columnmap1.keys()) + list(columnmap2.keys())
@@ -436,7 +1355,8 @@ def format(
     columnmap = {**columnmap1, **columnmap2}
     columnmap_inverse = {header: name for name, header in columnmap.items()}
     columnmap_inverse['_degree'] = 'degree'
-    for header in headerset:
-        matches = matches.rename({header: columnmap_inverse[header]})
+    columnmap_inverse['_degrees'] = 'degrees'
+    columnmap_inverse['_complete'] = 'complete'
+    matches = matches.rename({header: columnmap_inverse[header] for header in headerset})
     fields = [columnmap_inverse[header] for header in headerset]
     return matches.select(*fields)
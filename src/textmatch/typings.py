@@ -1,28 +1,82 @@
-from typing import Protocol, Callable, TypedDict, Optional
+from typing import TYPE_CHECKING, Protocol, runtime_checkable, Callable, TypedDict, NamedTuple, NotRequired, Optional
+import contextlib
+import os
 import polars
-import pyarrow # transitive dependency of polars
-import pandas # transitive dependency of polars
-import dedupe._typing
+
+if TYPE_CHECKING: # these are slow to import, and the aliases below are only evaluated by type checkers
+    import pyarrow # transitive dependency of polars
+    import pandas # transitive dependency of polars
+    import dedupe._typing
 
 type PolarsDataframe = polars.DataFrame
+type PolarsLazyframe = polars.LazyFrame
 type ArrowDataframe = pyarrow.Table
 type PandasDataframe = pandas.DataFrame
 
+@runtime_checkable
+class ArrowStreamable(Protocol):
+    def __arrow_c_stream__(self, requested_schema: object = None) -> object: ...
+
+@runtime_checkable
+class ArrowArrayable(Protocol):
+    def __arrow_c_array__(self, requested_schema: object = None) -> tuple[object, object]: ...
+
 type DedupeLabelledData = dedupe._typing.TrainingData
 
-MatchField = TypedDict('MatchField', {'1': str, '2': str})
+MatchField = TypedDict('MatchField', {'1': str, '2': str, 'weight': NotRequired[float]})
+
+Summary = TypedDict('Summary', {'sink': str, 'rows': int, 'columns': list[str]})
+
+class Sweep(TypedDict):
+    threshold: float
+    matches: int
+    histogram: list[int]
+    results: Optional[ArrowDataframe]
+
+class Stage(TypedDict):
+    stage: str
+    block: Optional[int]
+    detail: Optional[str]
+    wall: float
+    cpu: float
+    memory: int
+    rows_in: Optional[int]
+    rows_out: Optional[int]
+    pairs: Optional[int]
+
+class Prepared(NamedTuple):
+    name: Optional[str]
+    data: PolarsDataframe
+    columnmap: dict[str, str]
+    ignorant: dict[tuple[str, tuple[str, ...]], polars.Series] # normalised columns, worked out as blocks need them
+
+class Resources(TypedDict, total=False):
+    threads: int
+    memory: int
+    pairs: int
 
 class Matchblock(TypedDict, total=False):
     fields: list[MatchField]
     method: str
     ignores: list[str]
     threshold: float
+    model: str
+    training: str
+    disk: bool
+    workers: int
+    stopkeys: list[str]
+    fanout: int
+    aggregate: str
 
-type Source = dict[str, str] | PolarsDataframe | ArrowDataframe | PandasDataframe
+type Source = Prepared | dict[str, str] | PolarsDataframe | PolarsLazyframe | ArrowDataframe | PandasDataframe | ArrowStreamable | ArrowArrayable | str | os.PathLike
 type Matching = list[Matchblock]
-type Blocks = list[tuple[int, dict[str, str], dict[str, str], list[str], str, float]]
+type Blocks = list[tuple[int, dict[str, str], dict[str, str], list[str], str, float, Matchblock]]
+type Checkpoint = tuple[str, str] # directory, and a fingerprint of everything so far
+type Candidates = Callable[[PolarsDataframe, PolarsDataframe, str, str, float], Optional[PolarsDataframe]] # none if every pair needs scoring
 type Ticker = Callable[[int], Optional[Callable[[], None]]]
+type Measure = Callable[..., contextlib.AbstractContextManager[dict]]
 type Progress = Callable[[str, int], Callable[[], None]]
+type Profile = Callable[[Stage], None]
 
 class Alert(Protocol):
     def __call__(self, message: str, *, importance: Optional[str] = None) -> None: ...
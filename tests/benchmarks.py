@@ -1,23 +1,77 @@
+import functools
 import math
+import multiprocessing
+import queue
 import random
+import time
 import faker
 import textmatch
 
-def mock(specification, length):
+def mock(specification, length, matching=0.5, typos=0.0, duplicates=0.0, skew=0.0, seed=None):
     data1 = {}
     data2 = {}
-    length_half = math.ceil(length / 2)
-    fake = faker.Faker('en')
+    length_matching = math.ceil(length * matching)
+    randomiser = random.Random(seed)
     for column, form in specification.items():
-        items_matching = [getattr(fake, form)() for _ in range(length_half)]
-        items_unmatching1 = [getattr(fake, form)() for _ in range(length - length_half)]
-        items_unmatching2 = [getattr(fake, form)() for _ in range(length - length_half)]
+        items = pool(form, length * 2, column, seed) # enough for any match rate
+        items_matching = items[:length_matching]
+        items_unmatching1 = items[length_matching:length]
+        items_unmatching2 = items[length:(length * 2) - length_matching]
         data1[column] = [*items_matching, *items_unmatching1]
-        data2[column] = [*items_matching, *items_unmatching2]
-        random.shuffle(data1[column]) # in-place
-        random.shuffle(data2[column])
+        data2[column] = [*[typo(item, randomiser) if randomiser.random() < typos else item for item in items_matching], *items_unmatching2]
+    common = data1[next(iter(specification))][0] # the same value in both datasets
+    for data in [data1, data2]:
+        order = list(range(length))
+        randomiser.shuffle(order) # whole rows, so matches line up across columns
+        copies = {i: randomiser.randrange(length) for i in randomiser.sample(range(length), math.floor(length * duplicates))} # rows replaced with another row
+        skewed = set(randomiser.sample(range(length), math.floor(length * skew))) # rows where the first column takes the common value
+        for n, (column, values) in enumerate(data.items()):
+            values = [values[copies.get(i, i)] for i in order]
+            if n == 0: values = [common if i in skewed else value for i, value in enumerate(values)]
+            data[column] = values
     return (data1, data2)
 
+def isolated(target, args, timeout) -> dict:
+    # runs target(*args, results_queue) in a fresh process, so peak memory is not carried over, giving back what it puts on the queue
+    context = multiprocessing.get_context('spawn')
+    results_queue = context.Queue()
+    process = context.Process(target=target, args=(*args, results_queue))
+    process.start()
+    deadline = time.perf_counter() + timeout
+    result = None
+    while result is None and process.is_alive() and time.perf_counter() < deadline: # the process can die without giving a result, such as when it runs out of memory
+        try: result = results_queue.get(timeout=1)
+        except queue.Empty: continue
+    if result is None and process.is_alive():
+        process.kill()
+        process.join()
+        return {'failed': f'took more than {timeout:,} seconds'}
+    if result is None:
+        try: result = results_queue.get(timeout=1) # it may have finished between the last two checks
+        except queue.Empty: pass
+    process.join(timeout=10)
+    if process.is_alive(): # gave a result but never exited
+        process.kill()
+        process.join()
+    if result is None or process.exitcode != 0: return {'failed': f'exited with code {process.exitcode}'}
+    return result
+
+@functools.cache # generating values is slow, so reuse them between scenarios
+def pool(form, size, column, seed):
+    fake = faker.Faker('en')
+    if seed is not None: fake.seed_instance(f'{column}{seed}')
+    return [getattr(fake, form)() for _ in range(size)]
+
+def typo(text, randomiser):
+    if len(text) < 2: return text
+    i = randomiser.randrange(len(text) - 1)
+    letter = randomiser.choice('abcdefghijklmnopqrstuvwxyz')
+    match randomiser.choice(['deletion', 'insertion', 'substitution', 'transposition']):
+        case 'deletion': return text[:i] + text[i + 1:]
+        case 'insertion': return text[:i] + letter + text[i:]
+        case 'substitution': return text[:i] + letter + text[i + 1:]
+        case _: return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
 def test_literal(benchmark):
     specification = {
         'Person': 'name',
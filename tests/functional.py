@@ -1,4 +1,13 @@
+import asyncio
+import concurrent.futures
+import json
+import threading
+import pandas
+import polars
+import pyarrow
+import pytest
 import textmatch
+from textmatch.typings import Matching
 
 def test_simple():
     data1 = {
@@ -16,6 +25,65 @@ def test_simple():
         'person': ['William Shakespeare']
     }
 
+def test_sources_files(tmp_path):
+    polars.DataFrame({
+        'name': ['William Shakespeare', 'Christopher Marlowe'],
+        'born': ['1564', '1564']
+    }).write_parquet(tmp_path / 'data1.parquet')
+    polars.DataFrame({
+        'person': ['Anne Hathaway', 'William Shakespeare'],
+        'birth': ['1556', '1564']
+    }).write_ipc(tmp_path / 'data2.arrow')
+    (tmp_path / 'data3.csv').write_text('person,birth\nChristopher Marlowe,1564\n')
+    results = textmatch.run(
+        tmp_path / 'data1.parquet',
+        str(tmp_path / 'data2.arrow'),
+        matching=[
+            {'fields': [{'1': 'name', '2': 'person'}]}
+        ],
+        output=['1.name', '2.birth']
+    )
+    assert results.to_pydict() == {
+        'name': ['William Shakespeare'],
+        'birth': ['1564']
+    }
+    results = textmatch.run(
+        polars.scan_parquet(tmp_path / 'data1.parquet'),
+        tmp_path / 'data3.csv'
+    )
+    assert results.to_pydict() == {
+        'name': ['Christopher Marlowe'],
+        'born': ['1564'],
+        'person': ['Christopher Marlowe'],
+        'birth': ['1564']
+    }
+
+def test_sources_arrow_streams():
+    data1 = pandas.DataFrame({
+        'name': ['William Shakespeare', 'Christopher Marlowe'],
+        'born': ['1564', '1564']
+    }, index=[10, 20])
+    data2 = pyarrow.RecordBatchReader.from_batches(
+        pyarrow.schema([('person', pyarrow.string()), ('birth', pyarrow.string())]),
+        [
+            pyarrow.record_batch({'person': ['Anne Hathaway'], 'birth': ['1556']}),
+            pyarrow.record_batch({'person': ['William Shakespeare'], 'birth': ['1564']})
+        ]
+    )
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'fields': [{'1': 'name', '2': 'person'}]}
+        ]
+    )
+    assert results.to_pydict() == {
+        'name': ['William Shakespeare'],
+        'born': ['1564'],
+        'person': ['William Shakespeare'],
+        'birth': ['1564']
+    }
+
 def test_spaces_in_column_names():
     data1 = {
         'name': ['William Shakespeare', 'Christopher Marlowe']
@@ -519,6 +587,27 @@ def test_methods_damerau_levenshtein_no_matches():
         'person': []
     }
 
+def test_methods_damerau_levenshtein_threshold():
+    data1 = {
+        'name': ['Jane Austen', 'Charlotte Brontë', 'Emily Brontë']
+    }
+    data2 = {
+        'person': ['Jnae Ausetn', 'Charlotte Bronte', 'Anne Brontë']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'method': 'damerau-levenshtein', 'threshold': 0.8}
+        ],
+        output=['1*', '2*', 'degree']
+    )
+    assert results.to_pydict() == {
+        'name': ['Jane Austen', 'Charlotte Brontë'],
+        'person': ['Jnae Ausetn', 'Charlotte Bronte'],
+        'degree': ['0.8181818', '0.9375']
+    }
+
 def test_methods_damerau_levenshtein_fields():
     data1 = {
         'name': ['William Shakespeare', 'Christopher Marlowe'],
@@ -552,6 +641,73 @@ def test_methods_damerau_levenshtein_fields():
         'location': ['Henley Street']
     }
 
+def test_methods_damerau_levenshtein_fields_aggregated():
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe'],
+        'address': ['Henley Street', 'Corpus Christi']
+    }
+    data2 = {
+        'person': ['Will Sheikhspere', 'Kit Marlowe'],
+        'location': ['Henley Street', 'Corpus Christi']
+    }
+    minimum = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {
+                'fields': [
+                    {'1': 'name', '2': 'person'},
+                    {'1': 'address', '2': 'location'}
+                ],
+                'method': 'damerau-levenshtein',
+                'threshold': 0.5,
+                'aggregate': 'minimum'
+            }
+        ],
+        output=['1.name', '2.person', 'degrees']
+    )
+    assert minimum.to_pydict() == {
+        'name': ['William Shakespeare', 'Christopher Marlowe'],
+        'person': ['Will Sheikhspere', 'Kit Marlowe'],
+        'degrees': [[pytest.approx(0.6315789)], [pytest.approx(0.5263158)]]
+    }
+    mean = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {
+                'fields': [
+                    {'1': 'name', '2': 'person', 'weight': 3},
+                    {'1': 'address', '2': 'location', 'weight': 1}
+                ],
+                'method': 'damerau-levenshtein',
+                'threshold': 0.7,
+                'aggregate': 'mean'
+            }
+        ],
+        output=['1.name', '2.person', 'degrees']
+    )
+    assert mean.to_pydict() == {
+        'name': ['William Shakespeare'],
+        'person': ['Will Sheikhspere'],
+        'degrees': [[pytest.approx(0.7236842)]]
+    }
+    with pytest.raises(Exception, match='field weights must be more than zero'):
+        textmatch.run(
+            data1,
+            data2,
+            matching=[
+                {
+                    'fields': [
+                        {'1': 'name', '2': 'person', 'weight': 1},
+                        {'1': 'address', '2': 'location', 'weight': 0}
+                    ],
+                    'method': 'damerau-levenshtein',
+                    'aggregate': 'mean'
+                }
+            ]
+        )
+
 def test_methods_damerau_levenshtein_ignore_case():
     data1 = {
         'name': ['shakespeare']
@@ -609,6 +765,27 @@ def test_methods_partial_ratcliff_obershelp():
         'person': ['William Shakespeare']
     }
 
+def test_methods_partial_ratcliff_obershelp_threshold():
+    data1 = {
+        'address': ['Henley Street', 'Trinity Street', 'Nash', 'X']
+    }
+    data2 = {
+        'location': ['14 Henley St, Stratford', 'New Place, Chapel Street', 'Hall\'s Croft', 'X']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'method': 'partial-ratcliff-obershelp', 'threshold': 0.6}
+        ],
+        output=['1*', '2*', 'degree']
+    )
+    assert results.to_pydict() == {
+        'address': ['Henley Street', 'X'],
+        'location': ['14 Henley St, Stratford', 'X'],
+        'degree': ['0.6923077', '1.0']
+    }
+
 def test_methods_tokenset_ratcliff_obershelp():
     data1 = {
         'name': ['William Shakespeare']
@@ -723,6 +900,161 @@ def test_methods_double_metaphone_no_matches():
         'person': []
     }
 
+def test_methods_bilenko(tmp_path):
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe', 'Ben Jonson', 'Thomas Kyd', 'John Webster', 'Thomas Middleton', 'John Fletcher', 'Francis Beaumont', 'Thomas Dekker', 'George Chapman']
+    }
+    data2 = {
+        'person': ['Wiliam Shakespeare', 'Christopher Marlow', 'Benjamin Jonson', 'Anne Hathaway', 'Mary Sidney', 'John Donne', 'Edmund Spenser', 'Walter Raleigh', 'Philip Sidney', 'Thomas Nashe']
+    }
+    field = '_block0_match_col0'
+    labelled = {
+        'match': [('William Shakespeare', 'Wiliam Shakespeare'), ('Christopher Marlowe', 'Christopher Marlow'), ('Ben Jonson', 'Benjamin Jonson'), ('Thomas Kyd', 'Thomas Kydd'), ('John Webster', 'Jon Webster'), ('Thomas Dekker', 'Thomas Decker')],
+        'distinct': [('William Shakespeare', 'Anne Hathaway'), ('Christopher Marlowe', 'Mary Sidney'), ('Ben Jonson', 'John Donne'), ('Thomas Kyd', 'Thomas Nashe'), ('John Webster', 'Edmund Spenser'), ('Francis Beaumont', 'Walter Raleigh'), ('George Chapman', 'Philip Sidney'), ('John Fletcher', 'John Donne')]
+    }
+    (tmp_path / 'training.json').write_text(json.dumps({kind: [[{field: a}, {field: b}] for a, b in pairs] for kind, pairs in labelled.items()}))
+    messages = []
+    for disk in [False, True]: # trained from the labelled pairs first, then the saved model is used
+        messages.clear()
+        results = textmatch.run(
+            data1,
+            data2,
+            matching=[{
+                'fields': [{'1': 'name', '2': 'person'}],
+                'method': 'bilenko',
+                'threshold': 0.5,
+                'training': str(tmp_path / 'training.json'),
+                'model': str(tmp_path / 'model'),
+                'disk': disk,
+                'workers': 1
+            }],
+            alert=lambda message, importance=None: messages.append(message)
+        )
+        assert results.to_pydict() == {
+            'name': ['William Shakespeare', 'Christopher Marlowe'],
+            'person': ['Wiliam Shakespeare', 'Christopher Marlow']
+        }
+        assert messages[-1] == (f'{tmp_path / "model"}: using previously-trained model' if disk else f'{tmp_path / "training.json"}: using previously-labelled pairs')
+    assert len(json.loads((tmp_path / 'training.json').read_text())['match']) == len(labelled['match'])
+
+def test_methods_literal_stopkeys():
+    data1 = {
+        'name': ['William Shakespeare', 'Unknown', 'Christopher Marlowe']
+    }
+    data2 = {
+        'person': ['unknown', 'William Shakespeare', 'Unknown']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'ignores': ['case'], 'stopkeys': ['unknown']}
+        ]
+    )
+    assert results.to_pydict() == {
+        'name': ['William Shakespeare'],
+        'person': ['William Shakespeare']
+    }
+
+def test_methods_literal_fanout():
+    messages = []
+    data1 = {
+        'name': ['William Shakespeare', 'Anonymous', 'Anonymous']
+    }
+    data2 = {
+        'person': ['Anonymous', 'William Shakespeare', 'Anonymous']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'fanout': 3}
+        ],
+        alert=lambda message, importance=None: messages.append(message)
+    )
+    assert results.to_pydict() == {
+        'name': ['William Shakespeare'],
+        'person': ['William Shakespeare']
+    }
+    assert messages[-1] == 'match block (1) is ignoring values which would each produce more than 3 pairs: "Anonymous"'
+
+def test_methods_literal_common(monkeypatch):
+    monkeypatch.setattr(textmatch.textmatch, 'HOT_PAIRS', 2)
+    messages = []
+    data1 = {
+        'name': ['Anonymous', 'William Shakespeare', 'Anonymous', 'Anonymous']
+    }
+    data2 = {
+        'person': ['Anonymous', 'William Shakespeare', 'Anonymous']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        alert=lambda message, importance=None: messages.append(message)
+    )
+    assert sorted(zip(*results.to_pydict().values())) == [('Anonymous', 'Anonymous')] * 6 + [('William Shakespeare', 'William Shakespeare')]
+    assert messages[-1] == 'match block (1) is projected to produce 7 pairs, 86% of them from 1 common values: "Anonymous"'
+
+def test_methods_double_metaphone_fanout():
+    messages = []
+    data1 = {
+        'name': ['William Shakespeare', 'Anonymous', 'Anonymous']
+    }
+    data2 = {
+        'person': ['Anonymous', 'William Shakespeare', 'Anonymous']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'method': 'double-metaphone', 'fanout': 3}
+        ],
+        alert=lambda message, importance=None: messages.append(message)
+    )
+    assert results.to_pydict() == {
+        'name': ['William Shakespeare'],
+        'person': ['William Shakespeare']
+    }
+    assert [message for message in messages if 'ignoring' in message] == ['match block (1) is ignoring values which would each produce more than 3 pairs: "ANNMS"'] # once, though it is both codes for each anonymous row
+
+def test_methods_double_metaphone_pairs():
+    data1 = {
+        'name': ['Jones', 'Jones', 'Anne']
+    }
+    data2 = {
+        'person': ['Jones', 'Jones', 'Anne']
+    }
+    matching: Matching = [
+        {'fields': [{'1': 'name', '2': 'person'}], 'method': 'double-metaphone'}
+    ]
+    results = textmatch.run(data1, data2, matching=matching, resources={'pairs': 5}) # jones has two codes and anne has the same code twice, but each pair is only counted once
+    assert len(results) == 5
+    with pytest.raises(Exception, match='projected to produce 5 pairs, more than the limit of 4'):
+        textmatch.run(data1, data2, matching=matching, resources={'pairs': 4})
+
+def test_methods_fanout_later_block():
+    messages = []
+    data1 = {
+        'name': ['Smith', 'Smith', 'Smith', 'Jones']
+    }
+    data2 = {
+        'person': ['Smith', 'Smith', 'Smith', 'Jones']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'fields': [{'1': 'name', '2': 'person'}], 'method': 'double-metaphone'},
+            {'fields': [{'1': 'name', '2': 'person'}], 'method': 'literal', 'fanout': 3}
+        ],
+        alert=lambda message, importance=None: messages.append(message)
+    )
+    assert results.to_pydict() == {
+        'name': ['Jones'],
+        'person': ['Jones']
+    }
+    assert [message for message in messages if 'ignoring' in message] == ['match block (2) is ignoring values which would each produce more than 3 pairs: "Smith"']
+
 def test_methods_multiple1():
     data1 = {
         'forename': ['William', 'Mary', 'Anne'],
@@ -792,6 +1124,226 @@ def test_methods_multiple2():
         'firstname': ['William']
     }
 
+def test_dedupe():
+    data = {
+        'name': ['William Shakespeare', 'Christopher Marlowe', 'Will Shakespeare', 'William Shakespeare']
+    }
+    results = textmatch.dedupe(
+        data,
+        matching=[
+            {'method': 'damerau-levenshtein', 'threshold': 0.8}
+        ],
+        output=['1.name', '2.name', 'degree']
+    )
+    assert results.to_pydict() == {
+        'name_1': ['William Shakespeare', 'William Shakespeare', 'Will Shakespeare'],
+        'name_2': ['Will Shakespeare', 'William Shakespeare', 'William Shakespeare'],
+        'degree': ['0.84210527', '1.0', '0.84210527']
+    }
+
+def test_dedupe_mirror():
+    data = {
+        'name': ['William Shakespeare', 'Christopher Marlowe', 'William Shakespeare']
+    }
+    results = textmatch.dedupe(
+        data,
+        mirror=True
+    )
+    assert results.to_pydict() == {
+        'name_1': ['William Shakespeare', 'William Shakespeare'],
+        'name_2': ['William Shakespeare', 'William Shakespeare']
+    }
+
+def test_dedupe_fields_differing():
+    data = {
+        'name': ['Anne', 'Bob'],
+        'alias': ['Bob', 'Xavier']
+    }
+    with pytest.raises(Exception, match='dedupe: fields must be matched against themselves'):
+        textmatch.dedupe(
+            data,
+            matching=[
+                {'fields': [{'1': 'name', '2': 'alias'}]}
+            ]
+        )
+
+def test_run_async():
+    threads = set()
+    operations = []
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe']
+    }
+    data2 = {
+        'person': ['william shakespeare', 'Anne Hathaway']
+    }
+    def progress(operation, total):
+        threads.add(threading.get_ident())
+        operations.append(operation)
+        return lambda: threads.add(threading.get_ident())
+    async def main():
+        return await textmatch.run_async(
+            data1,
+            data2,
+            matching=[
+                {'ignores': ['case']}
+            ],
+            progress=progress
+        )
+    results = asyncio.run(main())
+    assert results.to_pydict() == {
+        'name': ['William Shakespeare'],
+        'person': ['william shakespeare']
+    }
+    assert operations == ['Literal matching...']
+    assert threads == {threading.get_ident()} # only ever called on the event loop
+
+def test_run_async_cancelled():
+    operations = []
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe']
+    }
+    data2 = {
+        'person': ['William Shakespeare', 'Anne Hathaway']
+    }
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    async def main():
+        def progress(operation, total):
+            operations.append(operation)
+            task.cancel() # during the first block
+            return lambda: None
+        task = asyncio.create_task(textmatch.run_async(
+            data1,
+            data2,
+            matching=[
+                {'fields': [{'1': 'name', '2': 'person'}]},
+                {'fields': [{'1': 'name', '2': 'person'}], 'method': 'damerau-levenshtein'}
+            ],
+            progress=progress,
+            executor=executor
+        ))
+        await task
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(main())
+    executor.shutdown(wait=True)
+    assert operations == ['(1) Literal matching...'] # the second block never started
+
+def test_prepare():
+    data1 = textmatch.prepare({
+        'name': ['William Shakespeare', 'Christopher Marlowe']
+    })
+    data2 = textmatch.prepare({
+        'person': ['WILLIAM SHAKESPEARE', 'Anne Hathaway']
+    })
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'ignores': ['case']}
+        ]
+    )
+    assert results.to_pydict() == {
+        'name': ['William Shakespeare'],
+        'person': ['WILLIAM SHAKESPEARE']
+    }
+    results = textmatch.run(
+        data2,
+        data1,
+        matching=[
+            {'ignores': ['case'], 'method': 'damerau-levenshtein'}
+        ],
+        output=['1.person', '2.name', 'degree']
+    )
+    assert results.to_pydict() == {
+        'person': ['WILLIAM SHAKESPEARE'],
+        'name': ['William Shakespeare'],
+        'degree': ['1.0']
+    }
+    assert len(data1.ignorant) == 1 # the normalised names were worked out once, then reused
+
+def test_prepare_dedupe():
+    data = textmatch.prepare({
+        'name': ['William Shakespeare', 'Christopher Marlowe', 'william shakespeare']
+    })
+    results = textmatch.dedupe(
+        data,
+        matching=[
+            {'ignores': ['case']}
+        ]
+    )
+    assert results.to_pydict() == {
+        'name_1': ['William Shakespeare'],
+        'name_2': ['william shakespeare']
+    }
+
+def test_sweep():
+    data1 = {
+        'name': ['William Shakespeare', 'Anne Hathaway', 'Christopher Marlowe']
+    }
+    data2 = {
+        'person': ['Wiliam Shakespeare', 'Ann Athawei', 'Christopher Marlowe']
+    }
+    matching: Matching = [{'method': 'damerau-levenshtein'}]
+    sweeps = textmatch.sweep(
+        data1,
+        data2,
+        thresholds=[0.9, 0.5],
+        matching=matching,
+        results=True
+    )
+    assert [(sweep['threshold'], sweep['matches'], sweep['histogram']) for sweep in sweeps] == [
+        (0.5, 3, [0, 0, 0, 0, 0, 0, 1, 0, 0, 2]),
+        (0.9, 2, [0, 0, 0, 0, 0, 0, 0, 0, 0, 2])
+    ]
+    for sweep in sweeps:
+        results = textmatch.run(data1, data2, matching=[{'method': 'damerau-levenshtein', 'threshold': sweep['threshold']}])
+        assert sweep['results'] == results
+
+def test_auto_block():
+    messages = []
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe']
+    }
+    data2 = {
+        'person': ['Wiliam Shakespeare', 'Kristopher Marlowe']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'method': 'damerau-levenshtein', 'threshold': 0.8}
+        ],
+        output=['1.name', '2.person', 'degrees'],
+        alert=lambda message, importance=None: messages.append(message),
+        auto_block=True
+    )
+    assert results.to_pydict() == {
+        'name': ['William Shakespeare', 'Christopher Marlowe'],
+        'person': ['Wiliam Shakespeare', 'Kristopher Marlowe'],
+        'degrees': [[pytest.approx(0.94736844)], [pytest.approx(0.89473683)]]
+    }
+    assert messages[-1] == 'automatic blocking on sound of first word of "name" × "person": estimated to keep 100% of matches while comparing 50.0% of pairs'
+
+def test_auto_block_sampled(monkeypatch):
+    monkeypatch.setattr(textmatch.textmatch, 'SAMPLE_PAIRS', 8) # only two rows from the first dataset
+    messages = []
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe', 'Ben Jonson', 'Thomas Kyd']
+    }
+    data2 = {
+        'person': ['Thomas Kydd', 'Benn Jonson', 'Kristopher Marlowe', 'Wiliam Shakespeare']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'method': 'damerau-levenshtein', 'threshold': 0.8}
+        ],
+        alert=lambda message, importance=None: messages.append(message),
+        auto_block=True
+    )
+    assert sorted(results['name'].to_pylist()) == ['Ben Jonson', 'Christopher Marlowe', 'Thomas Kyd', 'William Shakespeare']
+    assert messages[-1] == 'automatic blocking on sound of first word of "name" × "person": estimated to keep 100% of matches while comparing 25.0% of pairs'
+
 def test_output():
     data1 = {
         'Person Name': ['William Shakespeare', 'Christopher Marlowe'],
@@ -873,6 +1425,334 @@ def test_output_blocks():
         'degree': ['1.0; 1.0']
     }
 
+def test_output_blocks_three():
+    data1 = {
+        'forename': ['William', 'Christopher', 'Wilhelm'],
+        'surname': ['Shakespeare', 'Marlowe', 'Shakespeare'],
+        'born': ['1564', '1564', '1564']
+    }
+    data2 = {
+        'last_name': ['Shakespeare', 'Shakespeare', 'Marlowe'],
+        'first_name': ['Wiliam', 'John', 'Christopher'],
+        'birth': ['1564', '1564', '1583']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {
+                'fields': [{'1': 'surname', '2': 'last_name'}]
+            },
+            {
+                'fields': [{'1': 'forename', '2': 'first_name'}],
+                'method': 'damerau-levenshtein',
+                'threshold': 0.8
+            },
+            {
+                'fields': [{'1': 'born', '2': 'birth'}]
+            }
+        ],
+        output=['1*', 'degree']
+    )
+    assert results.to_pydict() == {
+        'forename': ['William'],
+        'surname': ['Shakespeare'],
+        'born': ['1564'],
+        'degree': ['1.0; 0.85714287; 1.0']
+    }
+
+def test_output_degrees():
+    data1 = {
+        'forename': ['William', 'Christopher'],
+        'surname': ['Shakespeare', 'Marlowe']
+    }
+    data2 = {
+        'last_name': ['Shakespeare', 'Shakespeare', 'Marlowe'],
+        'first_name': ['Wiliam', 'John', 'Kit']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {
+                'fields': [{'1': 'surname', '2': 'last_name'}]
+            },
+            {
+                'fields': [{'1': 'forename', '2': 'first_name'}],
+                'method': 'damerau-levenshtein'
+            }
+        ],
+        output=['1.forename', '2.first_name', 'degrees', 'degree'],
+        join='left-outer'
+    )
+    assert results.schema.field('degrees').type == pyarrow.large_list(pyarrow.float32())
+    assert results.to_pydict() == {
+        'forename': ['William', 'Christopher'],
+        'first_name': ['Wiliam', None],
+        'degrees': [[1.0, pytest.approx(0.85714287)], [None, None]],
+        'degree': ['1.0; 0.85714287', None]
+    }
+
+def test_output_sink(tmp_path):
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe'],
+        'born': ['1564', '1583']
+    }
+    data2 = {
+        'person': ['Anne Hathaway', 'William Shakespeare'],
+        'death': ['1623', '1616']
+    }
+    summary = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'fields': [{'1': 'name', '2': 'person'}]}
+        ],
+        output=['1*', '2.death', 'degree'],
+        sink=tmp_path / 'results.parquet'
+    )
+    assert summary == {
+        'sink': str(tmp_path / 'results.parquet'),
+        'rows': 1,
+        'columns': ['name', 'born', 'death', 'degree']
+    }
+    assert polars.read_parquet(tmp_path / 'results.parquet').to_dict(as_series=False) == {
+        'name': ['William Shakespeare'],
+        'born': ['1564'],
+        'death': ['1616'],
+        'degree': ['1.0']
+    }
+
+def test_output_sink_csv_degrees(tmp_path):
+    operations = []
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe']
+    }
+    data2 = {
+        'person': ['Anne Hathaway', 'William Shakespeare']
+    }
+    with pytest.raises(Exception, match='degrees is a list, which cannot be written to CSV'):
+        textmatch.run(
+            data1,
+            data2,
+            output=['1*', '2*', 'degrees'],
+            progress=lambda operation, total: operations.append(operation) or (lambda: None),
+            sink=tmp_path / 'results.csv'
+        )
+    assert operations == [] # refused before any matching
+    assert not (tmp_path / 'results.csv').exists()
+
+def test_profile():
+    stages = []
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe']
+    }
+    data2 = {
+        'person': ['william shakespeare', 'Anne Hathaway']
+    }
+    textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'ignores': ['case']},
+            {'method': 'damerau-levenshtein'}
+        ],
+        profile=stages.append
+    )
+    assert [(stage['stage'], stage['block'], stage['detail'], stage['pairs']) for stage in stages] == [
+        ('use', None, 'data1', None),
+        ('use', None, 'data2', None),
+        ('disambiguate', None, 'data1', None),
+        ('disambiguate', None, 'data2', None),
+        ('read', None, 'data1', None),
+        ('read', None, 'data2', None),
+        ('ignorance', 1, '1.name case', None),
+        ('ignorance', 1, '2.person case', None),
+        ('application', 1, None, None),
+        ('join', 1, None, 1),
+        ('pairs', 2, None, 1),
+        ('scoring', 2, None, 1),
+        ('supplement', None, None, None),
+        ('format', None, None, None)
+    ]
+    assert all(stage['wall'] >= 0 and stage['cpu'] >= 0 and stage['memory'] >= 0 for stage in stages)
+    assert stages[-1]['rows_out'] == 1
+
+def test_resources():
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe']
+    }
+    data2 = {
+        'person': ['William Shakespeer', 'Anne Hathaway']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'fields': [{'1': 'name', '2': 'person'}], 'method': 'damerau-levenshtein', 'threshold': 0.8}
+        ],
+        resources={'threads': 1, 'pairs': 4}
+    )
+    assert results.to_pydict() == {
+        'name': ['William Shakespeare'],
+        'person': ['William Shakespeer']
+    }
+
+def test_resources_pairs():
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe']
+    }
+    data2 = {
+        'person': ['William Shakespeer', 'Anne Hathaway']
+    }
+    with pytest.raises(Exception, match='more than the limit of 3'):
+        textmatch.run(
+            data1,
+            data2,
+            matching=[
+                {'fields': [{'1': 'name', '2': 'person'}], 'method': 'damerau-levenshtein', 'threshold': 0}
+            ],
+            resources={'pairs': 3}
+        )
+
+def test_resources_memory():
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe']
+    }
+    data2 = {
+        'person': ['William Shakespeare', 'Anne Hathaway']
+    }
+    matchings: list[Matching] = [
+        [{'fields': [{'1': 'name', '2': 'person'}], 'method': 'literal'}],
+        [{'fields': [{'1': 'name', '2': 'person'}], 'method': 'double-metaphone'}],
+        [{'fields': [{'1': 'name', '2': 'person'}], 'method': 'damerau-levenshtein', 'threshold': 0.8}]
+    ]
+    for matching in matchings:
+        with pytest.raises(Exception, match='match block \\(1\\) is estimated to use'):
+            textmatch.run(
+                data1,
+                data2,
+                matching=matching,
+                resources={'memory': 1}
+            )
+
+def test_checkpoint(tmp_path):
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe', 'William Shakespeare']
+    }
+    data2 = {
+        'person': ['William Shakespeer', 'Anne Hathaway', 'Christopher Marlow']
+    }
+    def matching(threshold: float) -> Matching:
+        return [
+            {'fields': [{'1': 'name', '2': 'person'}], 'method': 'double-metaphone'},
+            {'fields': [{'1': 'name', '2': 'person'}], 'method': 'damerau-levenshtein', 'threshold': threshold}
+        ]
+    messages = []
+    first = textmatch.run(data1, data2, matching=matching(0.8), checkpoint_dir=tmp_path)
+    resumed = textmatch.run(data1, data2, matching=matching(0.8), checkpoint_dir=tmp_path, alert=lambda message, importance=None: messages.append(message))
+    assert resumed.to_pydict() == first.to_pydict() == {
+        'name': ['William Shakespeare', 'William Shakespeare', 'Christopher Marlowe'],
+        'person': ['William Shakespeer', 'William Shakespeer', 'Christopher Marlow']
+    }
+    assert [message.split(',')[0] for message in messages if 'already done' in message] == ['match block (1) was already done', 'match block (2) was already done']
+    messages.clear()
+    textmatch.run(data1, data2, matching=matching(0.9), checkpoint_dir=tmp_path, alert=lambda message, importance=None: messages.append(message))
+    assert [message.split(',')[0] for message in messages if 'already done' in message] == ['match block (1) was already done'] # only the changed block is done again
+
+def test_checkpoint_tiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(textmatch.textmatch, 'TILE_PAIRS', 2)
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe', 'Ben Jonson']
+    }
+    data2 = {
+        'person': ['William Shakespeer', 'Anne Hathaway', 'Christopher Marlow']
+    }
+    matching: Matching = [
+        {'fields': [{'1': 'name', '2': 'person'}], 'method': 'damerau-levenshtein', 'threshold': 0.4} # low enough for every pair to be scored
+    ]
+    def interrupting(operation: str, total: int):
+        ticks = []
+        def tick():
+            ticks.append(None)
+            if len(ticks) == 2: raise KeyboardInterrupt
+        return tick
+    with pytest.raises(KeyboardInterrupt):
+        textmatch.run(data1, data2, matching=matching, checkpoint_dir=tmp_path, progress=interrupting)
+    assert len(list(tmp_path.glob('*.tile*'))) == 2 # nine pairs in tiles of two, with the first two done
+    resumed = textmatch.run(data1, data2, matching=matching, checkpoint_dir=tmp_path)
+    assert resumed.to_pydict() == textmatch.run(data1, data2, matching=matching).to_pydict() == {
+        'name': ['William Shakespeare', 'Christopher Marlowe'],
+        'person': ['William Shakespeer', 'Christopher Marlow']
+    }
+    assert list(tmp_path.glob('*.tile*')) == [] # replaced by the block's own file once it is done
+
+def test_deadline():
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe']
+    }
+    data2 = {
+        'person': ['William Shakespeare', 'Anne Hathaway']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'fields': [{'1': 'name', '2': 'person'}]}
+        ],
+        deadline=60
+    )
+    assert results.to_pydict() == {
+        'name': ['William Shakespeare'],
+        'person': ['William Shakespeare'],
+        'complete': [True]
+    }
+
+def test_deadline_reached():
+    messages = []
+    data1 = {
+        'name': ['William Shakespeare', 'Christopher Marlowe']
+    }
+    data2 = {
+        'person': ['William Shakespeare', 'Anne Hathaway']
+    }
+    results = textmatch.run(
+        data1,
+        data2,
+        matching=[
+            {'fields': [{'1': 'name', '2': 'person'}]}
+        ],
+        join='full-outer',
+        alert=lambda message, importance=None: messages.append(message),
+        deadline=0
+    )
+    assert results.to_pydict() == {
+        'name': ['William Shakespeare', 'Christopher Marlowe', None, None],
+        'person': [None, None, 'William Shakespeare', 'Anne Hathaway'],
+        'complete': [False, False, False, False]
+    }
+    assert messages[-1] == 'deadline reached with 0 of 2 rows from the first dataset matched, so some matches may be missing'
+
+def test_deadline_generous(monkeypatch):
+    monkeypatch.setattr(textmatch.textmatch, 'DEADLINE_ROWS', 1) # a slice for each row, so nothing differs only because it all fit in one
+    data1 = {
+        'name': ['Smith', 'Smith', 'Smith', 'Jones', 'Jonson']
+    }
+    data2 = {
+        'person': ['Smith', 'Smith', 'Jones', 'Johnson']
+    }
+    matching: Matching = [
+        {'fields': [{'1': 'name', '2': 'person'}], 'method': 'double-metaphone', 'fanout': 3},
+        {'fields': [{'1': 'name', '2': 'person'}], 'method': 'damerau-levenshtein', 'threshold': 0.5}
+    ]
+    expected = textmatch.run(data1, data2, matching=matching, output=['1*', '2*'])
+    assert textmatch.run(data1, data2, matching=matching, output=['1*', '2*'], deadline=60).to_pydict() == expected.to_pydict() == {
+        'name': ['Jones', 'Jonson'],
+        'person': ['Jones', 'Johnson']
+    } # smith has too many pairs across the whole of the first dataset, even though each slice alone would be within the fanout
+    with pytest.raises(Exception, match='more than the limit of 10'): # the limit counts pairs across every slice
+        textmatch.run(data1, data2, matching=[{'fields': [{'1': 'name', '2': 'person'}], 'method': 'damerau-levenshtein', 'threshold': 0.4}], resources={'pairs': 10}, deadline=60)
+
 def test_join_left_outer():
     data1 = {
         'name': ['William Shakespeare', 'Christopher Marlowe']
@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+RUNS = 5 # the fastest of these is used, as the first is often slowed down by a cold disk cache
+BUDGET = 0.5 # seconds for a cold import of textmatch, including polars
+DEFERRED = ['pyarrow', 'pandas', 'dedupe', 'sklearn', 'polars_ds', 'numpy', 'psutil', 'unidecode', 'doublemetaphone'] # only imported once they are needed
+
+def cold_import() -> tuple[float, list[str]]:
+    # a fresh interpreter each time, so nothing is already imported
+    program = f'import sys, textmatch; print(",".join(module for module in {DEFERRED!r} if module in sys.modules))'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', program], capture_output=True, text=True, check=True)
+    durations = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line: continue
+        _, cumulative, name = line.removeprefix('import time:').split('|')
+        durations[name.strip()] = int(cumulative) / 1_000_000
+    imported = [module for module in result.stdout.strip().split(',') if module]
+    return durations['textmatch'], imported
+
+def test_import_time():
+    duration, _ = min(cold_import() for _ in range(RUNS))
+    print(f'\nimport textmatch: {duration:.3f}s (budget {BUDGET}s)')
+    assert duration <= BUDGET
+
+def test_import_deferred():
+    _, imported = cold_import()
+    assert imported == []
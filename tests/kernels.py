@@ -0,0 +1,69 @@
+import polars
+import pytest
+import textmatch.textmatch
+from textmatch.methods import (
+    damerau_levenshtein,
+    ratcliff_obershelp,
+    partial_ratcliff_obershelp,
+    tokenset_ratcliff_obershelp,
+    tokenset_partial_ratcliff_obershelp,
+    jaro_winkler,
+    double_metaphone
+)
+from benchmarks import mock
+
+PAIRS = 2_000
+FORMS = ['first_name', 'name', 'address'] # short to long strings
+
+def pairs(form):
+    data1, data2 = mock({'Text': form}, PAIRS, typos=0.5, seed=1)
+    return polars.DataFrame({'text1': data1['Text'], 'text2': data2['Text']}) # half of the pairs match, with typos in half of those
+
+def texts(form):
+    data1, _ = mock({'Text': form}, PAIRS, seed=1)
+    return polars.DataFrame({'text': data1['Text']})
+
+@pytest.mark.parametrize('form', FORMS)
+@pytest.mark.parametrize('method', [
+    damerau_levenshtein,
+    ratcliff_obershelp,
+    partial_ratcliff_obershelp,
+    tokenset_ratcliff_obershelp,
+    tokenset_partial_ratcliff_obershelp,
+    jaro_winkler
+], ids=lambda method: method.__name__.split('.')[-1])
+def test_compare(benchmark, method, form):
+    data = pairs(form)
+    benchmark(method.compare, data, 'text1', 'text2', 'degree')
+
+@pytest.mark.parametrize('form', FORMS)
+@pytest.mark.parametrize('threshold', [0.6, 0.8]) # the default, and a stricter one
+@pytest.mark.parametrize('method', [
+    damerau_levenshtein,
+    partial_ratcliff_obershelp
+], ids=lambda method: method.__name__.split('.')[-1])
+def test_candidates(benchmark, method, threshold, form):
+    data = pairs(form)
+    data1 = data.select(polars.int_range(PAIRS, dtype=polars.UInt32).alias('_data1_id'), 'text1')
+    data2 = data.select(polars.int_range(PAIRS, dtype=polars.UInt32).alias('_data2_id'), 'text2')
+    benchmark(method.candidates, data1, data2, 'text1', 'text2', threshold)
+
+@pytest.mark.parametrize('form', FORMS)
+def test_apply_double_metaphone(benchmark, form):
+    values = texts(form)['text'].to_list()
+    benchmark(lambda: [double_metaphone.apply(value) for value in values])
+
+@pytest.mark.parametrize('form', FORMS)
+@pytest.mark.parametrize('ignore', [
+    textmatch.textmatch.ignore_case,
+    textmatch.textmatch.ignore_nonalpha,
+    textmatch.textmatch.ignore_nonlatin,
+    textmatch.textmatch.ignore_words_leading,
+    textmatch.textmatch.ignore_words_tailing,
+    textmatch.textmatch.ignore_words_order,
+    textmatch.textmatch.ignore_regex(['[aeiou]'], False),
+    textmatch.textmatch.ignore_titles(False)
+], ids=['case', 'nonalpha', 'nonlatin', 'words-leading', 'words-tailing', 'words-order', 'regex', 'titles'])
+def test_ignore(benchmark, ignore, form):
+    data = texts(form)
+    benchmark(ignore, data, 'text')
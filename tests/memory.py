@@ -1,32 +1,86 @@
+import random
 import time
+import pyarrow
+import pytest
 import textmatch
+import textmatch.textmatch
+from benchmarks import isolated
 
-def test_out_of_memory():
-    for count in [10_000, 50_000, 100_000]:
-        print(f'\nRunning with {count} × {count} rows...')
-        data1 = {
-            'code1': ['A' if i % 2 == 0 else 'B' for i in range(count)],
-            'number1': [str(i) * 10 for i in range(count)]
-        }
-        data2 = {
-            'code2': ['A' if i % 2 == 0 else 'Z' for i in range(count)],
-            'number2': [str(i) * 10 for i in range(count)]
-        }
-        start = time.time()
-        results = textmatch.run(
-            data1,
-            data2,
-            matching=[
-                {
-                    'fields': [{'1': 'code1', '2': 'code2'}],
-                    'method': 'literal'
-                },
-                {
-                    'fields': [{'1': 'number1', '2': 'number2'}],
-                    'method': 'damerau-levenshtein'
-                }
-            ],
-            alert=lambda message, importance=None: print(message)
-        )
-        duration = time.time() - start
-        print(f'Success: matched {len(results):,} rows in {duration:.0f}s')
+SYLLABLES = ['an', 'bel', 'car', 'dun', 'el', 'fitz', 'gar', 'hol', 'ing', 'jon', 'kel', 'lor', 'mac', 'nor', 'ost', 'per', 'quin', 'ros', 'son', 'ter', 'ul', 'van', 'wil', 'yor']
+
+def word(randomiser, syllables=3):
+    return ''.join(randomiser.choice(SYLLABLES) for _ in range(syllables)).capitalize()
+
+def blocking(randomiser, rows):
+    codes = [f'C{randomiser.randrange(1_000)}' for _ in range(rows)] # thousands of pairs of rows for every code
+    numbers = [str(randomiser.randrange(10**12)) for _ in range(rows)]
+    data1 = {'code1': codes, 'number1': numbers}
+    data2 = {'code2': codes, 'number2': [number[:-1] + '0' if i % 2 == 0 else number for i, number in enumerate(numbers)]}
+    matching = [
+        {'fields': [{'1': 'code1', '2': 'code2'}], 'method': 'literal'},
+        {'fields': [{'1': 'number1', '2': 'number2'}], 'method': 'damerau-levenshtein', 'threshold': 0.9}
+    ]
+    return data1, data2, matching, 'inner'
+
+def phonetic(randomiser, rows):
+    names = [f'{word(randomiser)} {word(randomiser)}' for _ in range(rows)]
+    data1 = {'name1': names}
+    data2 = {'name2': [name.replace('c', 'k') if i % 3 == 0 else name for i, name in enumerate(reversed(names))]}
+    matching = [{'fields': [{'1': 'name1', '2': 'name2'}], 'method': 'double-metaphone'}]
+    return data1, data2, matching, 'inner'
+
+def outer(randomiser, rows):
+    names = [f'{word(randomiser)} {word(randomiser)}' for _ in range(rows * 2)]
+    data1 = {'name1': names[:rows]}
+    data2 = {'name2': names[rows // 2:rows + rows // 2]} # half of each dataset matches
+    matching = [{'fields': [{'1': 'name1', '2': 'name2'}], 'method': 'literal'}]
+    return data1, data2, matching, 'full-outer'
+
+def wide(randomiser, rows):
+    keys = [f'{word(randomiser)} {randomiser.randrange(10**6)}' for _ in range(rows)]
+    data1 = {'key1': keys, **{f'payload1_{i}': [word(randomiser, 12) for _ in range(rows)] for i in range(20)}}
+    data2 = {'key2': list(reversed(keys)), **{f'payload2_{i}': [word(randomiser, 12) for _ in range(rows)] for i in range(20)}}
+    matching = [{'fields': [{'1': 'key1', '2': 'key2'}], 'method': 'literal'}]
+    return data1, data2, matching, 'inner'
+
+def common(randomiser, rows):
+    names = [f'{word(randomiser)} {word(randomiser)}' for _ in range(rows)]
+    data1 = {'name1': ['Unknown' if i % 100 == 0 else name for i, name in enumerate(names)]} # a value shared by many rows on both sides
+    data2 = {'name2': ['Unknown' if i % 100 == 1 else name for i, name in enumerate(names)]}
+    matching = [{'fields': [{'1': 'name1', '2': 'name2'}], 'method': 'literal'}]
+    return data1, data2, matching, 'inner'
+
+TIMEOUT = 600 # seconds a scenario can take before it is treated as a failure
+ARROW_BUDGET = 16 # megabytes Arrow's own memory pool can reach, as results are handed over from polars without being copied
+
+SCENARIOS = { # generator, rows in each dataset, budget for growth in peak memory in megabytes
+    'blocking': (blocking, 50_000, 500),
+    'phonetic': (phonetic, 100_000, 500),
+    'outer': (outer, 100_000, 100),
+    'wide': (wide, 100_000, 700),
+    'common': (common, 100_000, 200)
+}
+
+def measure(name, results_queue):
+    generator, rows, _ = SCENARIOS[name]
+    data1, data2, matching, join = generator(random.Random(1), rows)
+    memory = textmatch.textmatch.peak_memory()
+    start = time.perf_counter()
+    results = textmatch.run(data1, data2, matching=matching, join=join)
+    results_queue.put({
+        'seconds': time.perf_counter() - start,
+        'rows': len(results),
+        'memory': textmatch.textmatch.peak_memory() - memory,
+        'arrow_peak': pyarrow.default_memory_pool().max_memory(),
+        'arrow_allocated': pyarrow.total_allocated_bytes()
+    })
+
+@pytest.mark.parametrize('name', SCENARIOS.keys())
+def test_memory(name):
+    result = isolated(measure, (name,), TIMEOUT)
+    assert 'failed' not in result, f'{name}: {result.get("failed")}'
+    budget = SCENARIOS[name][2]
+    print(f'\n{name}: {result["rows"]:,} rows in {result["seconds"]:.1f}s, peak memory grew {result["memory"] / 1024**2:,.0f}MB (budget {budget:,}MB), Arrow peak {(result["arrow_peak"] or 0) / 1024**2:,.0f}MB (budget {ARROW_BUDGET:,}MB)')
+    assert result['memory'] <= budget * 1024**2
+    assert (result['arrow_peak'] or 0) <= ARROW_BUDGET * 1024**2
+    assert result['arrow_allocated'] <= ARROW_BUDGET * 1024**2
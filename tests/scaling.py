@@ -0,0 +1,147 @@
+import argparse
+import datetime
+import json
+import pathlib
+import platform
+import subprocess
+import time
+import polars
+import textmatch
+import textmatch.textmatch
+from benchmarks import isolated, mock
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+PAIRS_LIMIT = 10_000_000 # scenarios projected to consider more pairs than this are skipped, unless changed with --pairs-limit
+SURNAMES = 1_000 # roughly how many distinct surnames faker produces, for estimating blocked pairs
+TIMEOUT = 3_600 # seconds a scenario can take before it is stopped
+
+METHODS = [
+    'literal',
+    'damerau-levenshtein',
+    'ratcliff-obershelp',
+    'partial-ratcliff-obershelp',
+    'tokenset-ratcliff-obershelp',
+    'tokenset-partial-ratcliff-obershelp',
+    'jaro-winkler',
+    'double-metaphone'
+]
+
+IGNORES = [
+    'case',
+    'nonalpha',
+    'nonlatin',
+    'titles',
+    'words-leading',
+    'words-tailing',
+    'words-order',
+    'regex=[aeiou]'
+]
+
+def scenarios(size):
+    compared = size * size
+    blocked = compared // SURNAMES
+    person = {'Person': 'name'}
+    people = {'Surname': 'last_name', 'Forename': 'first_name', 'Office': 'company'}
+    def fields(*keys): return [{'1': key, '2': key} for key in keys]
+    for method in METHODS:
+        estimate = size if method in ['literal', 'double-metaphone'] else compared
+        yield f'method/{method}', estimate, person, {}, [{'method': method}]
+    for ignore in IGNORES:
+        yield f'ignore/{ignore}', size, person, {}, [{'ignores': [ignore]}]
+    for form in ['first_name', 'name', 'address']: # short to long strings
+        yield f'length/{form}/literal', size, {'Person': form}, {}, [{}]
+        yield f'length/{form}/damerau-levenshtein', compared, {'Person': form}, {}, [{'method': 'damerau-levenshtein'}]
+    for rate in [0.1, 0.5, 0.9]:
+        yield f'matching/{rate}', size, person, {'matching': rate}, [{}]
+    for rate in [0.1, 0.5]:
+        yield f'typos/{rate}', compared, person, {'typos': rate}, [{'method': 'damerau-levenshtein'}]
+    for rate in [0.1, 0.5]:
+        yield f'duplicates/{rate}', size, person, {'duplicates': rate}, [{}]
+    for rate in [0.001, 0.01, 0.1]:
+        yield f'skew/{rate}', int(size + (size * rate) ** 2), person, {'skew': rate}, [{}]
+    yield 'blocks/literal+damerau-levenshtein', blocked, people, {'typos': 0.2}, [
+        {'fields': fields('Surname')},
+        {'fields': fields('Forename'), 'method': 'damerau-levenshtein'}
+    ]
+    yield 'blocks/double-metaphone+jaro-winkler', blocked, people, {'typos': 0.2}, [
+        {'fields': fields('Surname'), 'method': 'double-metaphone'},
+        {'fields': fields('Forename'), 'method': 'jaro-winkler'}
+    ]
+    yield 'blocks/literal+aggregated-damerau-levenshtein', blocked, people, {'typos': 0.2}, [
+        {'fields': fields('Surname'), 'ignores': ['case']},
+        {'fields': fields('Forename', 'Office'), 'method': 'damerau-levenshtein', 'aggregate': 'mean'}
+    ]
+
+def measure(data1, data2, matching, results_queue):
+    stages = []
+    memory = textmatch.textmatch.peak_memory()
+    start = time.perf_counter()
+    results = textmatch.run(data1, data2, matching=matching, profile=stages.append)
+    duration = time.perf_counter() - start
+    results_queue.put({
+        'seconds': duration,
+        'pairs': sum(stage['pairs'] or 0 for stage in stages if stage['stage'] in ['join', 'pairs']),
+        'matches': len(results),
+        'memory': textmatch.textmatch.peak_memory() - memory
+    })
+
+def commit():
+    try: return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): return None
+
+def compare(results, path):
+    previous = {(result['name'], result['size']): result for result in json.loads(pathlib.Path(path).read_text())['results']}
+    print(f'\nCompared with {path}:')
+    for result in results:
+        before = previous.get((result['name'], result['size']))
+        if before is None or 'failed' in before or 'failed' in result: continue
+        speed = result['seconds'] / before['seconds'] if before['seconds'] else float('nan')
+        memory = result['memory'] / before['memory'] if before['memory'] else float('nan')
+        flag = '  <-- slower' if speed > 1.1 else ''
+        print(f'{result["name"]:<50} {result["size"]:>9,}  time ×{speed:.2f}  memory ×{memory:.2f}{flag}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure how matching scales with dataset size.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='numbers of rows in each dataset')
+    parser.add_argument('--only', help='only run scenarios whose names start with this')
+    parser.add_argument('--pairs-limit', type=int, default=PAIRS_LIMIT, help='skip scenarios projected to consider more pairs than this')
+    parser.add_argument('--output', help='where to write the results (defaults to a new file in .benchmarks/scaling)')
+    parser.add_argument('--compare', help='results from a previous run to compare against')
+    arguments = parser.parse_args()
+    results = []
+    for size in arguments.sizes:
+        for name, estimate, specification, options, matching in scenarios(size):
+            if arguments.only and not name.startswith(arguments.only): continue
+            if estimate > arguments.pairs_limit:
+                print(f'{name:<50} {size:>9,}  skipped, around {estimate:,} pairs')
+                continue
+            data1, data2 = mock(specification, size, seed=1, **options)
+            result = isolated(measure, (data1, data2, matching), TIMEOUT)
+            if 'failed' in result:
+                results.append({'name': name, 'size': size, **result})
+                print(f'{name:<50} {size:>9,}  failed, {result["failed"]}')
+                continue
+            results.append({
+                'name': name,
+                'size': size,
+                **result,
+                'pairs_per_second': result['pairs'] / result['seconds'],
+                'rows_per_second': (size * 2) / result['seconds']
+            })
+            print(f'{name:<50} {size:>9,}  {result["seconds"]:8.2f}s  {result["pairs"] / result["seconds"]:14,.0f} pairs/s  {(size * 2) / result["seconds"]:12,.0f} rows/s  {result["memory"] / 1024**2:8,.0f}MB')
+    now = datetime.datetime.now(datetime.UTC)
+    output = pathlib.Path(arguments.output or f'.benchmarks/scaling/{now:%Y%m%d-%H%M%S}-{commit() or "unknown"}.json')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'commit': commit(),
+        'time': now.isoformat(),
+        'python': platform.python_version(),
+        'polars': polars.__version__,
+        'machine': platform.platform(),
+        'results': results
+    }, indent=4))
+    print(f'\nResults written to {output}')
+    if arguments.compare: compare(results, arguments.compare)
+
+if __name__ == '__main__':
+    main()